@@ -17,6 +17,10 @@ from matplotlib import pyplot as plt
 now = datetime.datetime.now()
 path = os.environ["SLICEOP_PATH"]
 
+# make the shared modules in SLICEop/sliceop importable
+sys.path.append(path)
+from sliceop import climatology, seasonmatrix
+
 # if running TEST, take year, month, day from environment variables
 # otherwise extract year, month, day from `datetime.datetime.now
 if os.environ["TEST"]=="True":
@@ -41,14 +45,12 @@ yesterday = np.datetime64(
     ) - np.timedelta64(1, "D")
 # datetime64 of the start (July 1)
 start = np.datetime64(year + "-07-01")
-# load the time series of water temperature including the most recent and
-# extract the required date range
-twu = xr.open_dataset(
+# load the water temperature of all seasons, one row per season on the
+# July 1 - June 30 axis, the current season is taken from the most recent data
+# with the mean offset removed
+tw_seasons, tw_matrix = seasonmatrix.load_season_matrix(
+    path + "/prepro/Twater_Longueuil_preprocessed.nc",
     path + "/downloads/Twater/Twater_Longueuil_updated.nc"
-    ).sel(Date=slice(start, yesterday))
-# load the preprocessed data
-twp = xr.open_dataset(
-    path + "/prepro/Twater_Longueuil_preprocessed.nc"
     )
 # load observed freeze-up dates
 FUD = xr.open_dataset(
@@ -103,14 +105,10 @@ else:
         datetime.datetime.strptime(str(year) + " " + str(int(np.around(latestFUD))),
                                    "%Y %j")
         )[0:10]
-# remove mean offset from current season's data
-tw = (twu.T - twp.T_winter_offset.mean().values)
-# compute climatological cycle
-tw_c = twp.T_no_offset.groupby("Date.dayofyear").mean("Date").values[0:-1]
-# offest the climatology so that it runs from July 1 tp June 30
-tw_c1 = tw_c[182::]
-tw_c2 = tw_c[0:182]
-tw_clim = np.hstack([tw_c1, tw_c2])
+# load the climatological cycle, it runs from July 1 to June 30
+tw_clim = climatology.load_climatology(
+    path + "/prepro/Twater_Longueuil_preprocessed.nc"
+    )[:, climatology.STATS.index("mean")]
 # use a random, non-leap year to create a time axis for the plot. only the
 # month and day will be used later, the year is unimportant
 climtime = pd.date_range(
@@ -118,33 +116,13 @@ climtime = pd.date_range(
     end=datetime.datetime.strptime("2002 181", "%Y %j"),
     freq="1D"
     )
-y = int(year)
-# define the date range to extract from the time series
-# start one day later in leap years, i.e. keeping the delta t to the last
-# day of the year the same
-if y % 4 == 0 and (y % 100 != 0 or y % 400 == 0):
-    ctime = pd.date_range(
-        start=datetime.datetime.strptime(year + " " + str(183), "%Y %j"),
-        end=datetime.datetime.strptime(str(int(year) + 1) + " " + str(181),
-                                       "%Y %j"),
-        freq="1D"
-        )
-else:
-    ctime = pd.date_range(
-        start=datetime.datetime.strptime(year + " " + str(182), "%Y %j"),
-        end=datetime.datetime.strptime(str(int(year) + 1) + " " + str(181),
-                                       "%Y %j"),
-        freq="1D"
-        )
-# remove the mean offset to make the
-# recent data comparable to preprocessed data from past seasons
-tw = (twu.T.sel(Date=slice(str(ctime[0]), str(ctime[-1])))
-      - twp.T_winter_offset.mean().values)
-# set negatives to 0
-tw[tw < 0] = 0
-# add missing values for future dates
-missing = 365 - len(tw)
-tw = list(list(tw) + [np.nan] * missing)
+# extract the current season from July 1 until yesterday, future dates are
+# missing values
+tw = np.full(tw_matrix.shape[1], np.nan)
+row = int(year) - tw_seasons[0]
+if row < len(tw_seasons):
+    last = np.clip((yesterday - start).astype(int) + 1, 0, len(tw))
+    tw[:last] = tw_matrix[row, :last]
 
 # if river is already frozen, get the date of freeze-up
 with open(path + "/auto/frozen", "r") as f:
@@ -1,7 +1,8 @@
 ''' daily_prepare_data_for_echart
 
 Needs to be run daily to update the input data to be plotted on the interactive
-echart.
+echart. Each season is written to its own javascript payload file, only the
+files whose content changed are rewritten (usually only the current season).
 
 '''
 import os
@@ -12,13 +13,16 @@ import locale
 import numpy as np
 import xarray as xr
 import pandas as pd
-from matplotlib import pyplot as plt
 import cmocean.cm as cmo
 
 # define path
 now = datetime.datetime.now()
 path = os.environ["SLICEOP_PATH"]
 
+# make the shared modules in SLICEop/sliceop importable
+sys.path.append(path)
+from sliceop import climatology, echart, seasonmatrix
+
 # get year and month from `datetime.now()`
 thisyear = now.year
 thismonth = now.month
@@ -28,44 +32,28 @@ ymin = 1992
 
 # define which colormap to use in echart
 cmap = cmo.thermal
+# directory of the echart and its data
+echart_dir = path + "/echart"
+# write the water temperature series as compact payloads (quantized to
+# 0.01 deg. Celsius, decoded in the browser by `sliceop_decode.js`), set to
+# False to write them as plain javascript arrays
+compact = True
 
-# load preprocessed data
-tw = xr.open_dataset(
+# load the water temperature of all seasons, one row per season on the
+# July 1 - June 30 axis, the current season is taken from the most recent data
+# (lower level of preprocessing) with the mean offset removed
+tw_seasons, tw_matrix = seasonmatrix.load_season_matrix(
+    path + "/prepro/Twater_Longueuil_preprocessed.nc",
+    path + "/downloads/Twater/Twater_Longueuil_updated.nc"
+    )
+# load the climatological seasonal cycle (mean, standard deviation, minimum
+# and maximum observed for each day), already on the July 1 - June 30 axis
+clim = climatology.load_climatology(
     path + "/prepro/Twater_Longueuil_preprocessed.nc"
     )
-# compute climatological seasonal cycle
-tw_c = tw.T_no_offset.sel(
-    Date=slice(None, str(thisyear-1) + "-06-30")
-    ).groupby("Date.dayofyear").mean("Date").values[0:-1]
-# compute standard deviation of seasonal cycle
-tw_cstd = tw.T_no_offset.sel(
-    Date=slice(None, str(thisyear-1) + "-06-30")
-    ).groupby("Date.dayofyear").std("Date").values[0:-1]
-# compute the minimum observed for each day
-tw_cmin = tw.T_no_offset.sel(
-    Date=slice(None, str(thisyear-1) + "-06-30")
-    ).groupby("Date.dayofyear").min("Date").values[0:-1]
-# compute maximum observed for each day
-tw_cmax = tw.T_no_offset.sel(
-    Date=slice(None, str(thisyear-1) + "-06-30")
-    ).groupby("Date.dayofyear").max("Date").values[0:-1]
-# load most recent data (lower level of preprocessing)
-tw_up = xr.open_dataset(path + "/downloads/Twater/Twater_Longueuil_updated.nc")
+tw_clim, tw_climstd, tw_climmin, tw_climmax = clim.T
 # load the observed freeze-up dates for all years
 fud = xr.open_dataset(path + "/prepro/FUD_preprocessed.nc")
-# shift all variables so that the axis is from July 1 to June 30
-tw_c1 = tw_c[182::]
-tw_c2 = tw_c[0:182]
-tw_clim = np.hstack([tw_c1, tw_c2])
-tw_cstd1 = tw_cstd[182::]
-tw_cstd2 = tw_cstd[0:182]
-tw_climstd = np.hstack([tw_cstd1, tw_cstd2])
-tw_cmin1 = tw_cmin[182::]
-tw_cmin2 = tw_cmin[0:182]
-tw_climmin = np.hstack([tw_cmin1, tw_cmin2])
-tw_cmax1 = tw_cmax[182::]
-tw_cmax2 = tw_cmax[0:182]
-tw_climmax = np.hstack([tw_cmax1, tw_cmax2])
 
 # load 'frozen' to see if river is frozen or not and convert to python bool
 with open(path + "/auto/frozen", "r") as f:
@@ -146,19 +134,22 @@ sliceop_data['date'] = [str(climtime[i])[5:10]
 sliceop_data['years'] = [str(i) + "/" + str(i + 1)
                          for i in np.arange(1992, thisyear)]
 # add climatology
-sliceop_data['clim'] = list(tw_clim)
+clim_data = {}
+clim_data['clim'] = tw_clim
 #sliceop_data['clim'] = [[sliceop_data['date'][i], sliceop_data['clim'][i]] for i in range(0, len(sliceop_data['clim']))]
 #sliceop_data['clim-std'] = list(tw_clim - tw_climstd)
 #sliceop_data['clim+std'] = list(2 * tw_climstd)
 # add minimum
-sliceop_data['clim-std'] = list(tw_climmin)
+clim_data['clim-std'] = tw_climmin
 # add maximum - minimum (needed to plot the range between minimum and maximum)
-sliceop_data['clim+std'] = list(tw_climmax - tw_climmin)
+clim_data['clim+std'] = tw_climmax - tw_climmin
 #sliceop_data['clim-std'] = [[sliceop_data['date'][i], sliceop_data['clim-std'][i]] for i in range(0, len(sliceop_data['clim']))]
 #sliceop_data['clim+std'] = [[sliceop_data['date'][i], sliceop_data['clim+std'][i]] for i in range(0, len(sliceop_data['clim']))]
-# define dictionaries to contain the RGB colors and the freeze-up dates
+# define dictionaries to contain the RGB colors and the freeze-up dates and
+# a list of the payload files of all seasons
 colormap = {}
 fuds = {}
+season_files = []
 # depending on the month we are in, a different year will be needed to define
 # the colormap
 if thismonth > 6:
@@ -171,47 +162,27 @@ else:
 cpos = np.linspace(0.2, 0.8, tyear - ymin)
 # extract data for each season (Jul. 1 - Jun. 30)
 for y in np.arange(ymin, tyear):
-    year = str(y)
-    # start one day later in leap years, i.e. keeping the delta t to the last
-    # day of the year the same
-    if y % 4 == 0 and (y % 100 != 0 or y % 400 == 0):
-        ctime = pd.date_range(
-            start=datetime.datetime.strptime(year + " " + str(183), "%Y %j"),
-            end=datetime.datetime.strptime(str(int(year) + 1) + " " + str(181),
-                                           "%Y %j"),
-            freq="1D"
-            )
+    # row of the season, seasons after the end of the record are all NaN
+    row = y - tw_seasons[0]
+    if row < len(tw_seasons):
+        tw_out = tw_matrix[row].astype(float)
     else:
-        ctime = pd.date_range(
-            start=datetime.datetime.strptime(year + " " + str(182), "%Y %j"),
-            end=datetime.datetime.strptime(str(int(year) + 1) + " " + str(181),
-                                           "%Y %j"),
-            freq="1D"
-            )
-    # if we are in the current season, remove the mean offset to make the
-    # recent data comparable to preprocessed data from past seasons
-    if (((y==thisyear) & (thismonth>6)) | ((y==thisyear-1) & (thismonth<=6))):
-        # subtract the mean offset
-        tw_out = (tw_up.T.sel(Date=slice(str(ctime[0]), str(ctime[-1])))
-                  - tw.T_winter_offset.mean()).values
-        # set negatives to 0
-        tw_out[tw_out < 0] = 0
-        # add missing values for future dates
-        missing = 365 - len(tw_out)
-        sliceop_data[str(y) + "/" + str(y + 1)] = list(
-            list(tw_out) + [np.nan] * missing
-            )
-        #sliceop_data[str(y) + "/" + str(y + 1)] = [[sliceop_data['date'][i], sliceop_data[str(y) + "/" + str(y + 1)][i]]
-        #                                           for i in range(0, len(sliceop_data[str(y) + "/" + str(y + 1)]))]
-    # if we are in past seasons, add the preprocessed data to dataset
+        tw_out = np.full(tw_matrix.shape[1], np.nan)
+    current = (((y==thisyear) & (thismonth>6))
+               | ((y==thisyear-1) & (thismonth<=6)))
+    # each season has its own payload file, the file of the current season
+    # changes every day while those of past seasons only change once a year
+    payload = echart.js_series('datain["' + echart.season_name(y) + '"]',
+                               tw_out, compact)
+    if current:
+        season_files.append(echart.write_payload(echart_dir, "current.js",
+                                                 payload))
     else:
-        tw_out = tw.T_no_offset.sel(Date=ctime).values
-        sliceop_data[str(y) + "/" + str(y + 1)] = list(tw_out)
-        #sliceop_data[str(y) + "/" + str(y + 1)] = [[sliceop_data['date'][i], sliceop_data[str(y) + "/" + str(y + 1)][i]]
-        #                                           for i in range(0, len(sliceop_data[str(y) + "/" + str(y + 1)]))]
+        season_files.append(echart.write_payload(
+            echart_dir, echart.season_file(y), payload))
     # add either the observed or forecasted freeze-up date to the
     # time series of freeze-up dates
-    if (((y==thisyear) & (thismonth>6)) | ((y==thisyear-1) & (thismonth<=6))):
+    if current:
         if not frozen:
             fuds[str(y) + "/" + str(y+1)] = latest["latestForecast"][5:10]
         else:
@@ -231,22 +202,21 @@ fudoys[fudoys<182] = fudoys[fudoys<182] + 365
 fuds["clim"] = str(datetime.datetime.strptime("2001 "
     + str(int(np.around(np.mean(fudoys)))), "%Y %j"))[5:10]
 
-# save data to json files
-with open(path + '/echart/sliceop_data.json', 'w') as fp:
-    json.dump(sliceop_data, fp)
-
-with open(path + '/echart/colormap.json', 'w') as fp:
-    json.dump(colormap, fp)
-
-with open(path + '/echart/fuds.json', 'w') as fp:
-    json.dump(fuds, fp)
-
-with open(path + '/echart/latest.json', 'w') as fp:
-    json.dump(latest, fp)
-
+# save data as javascript files that are loaded by `sliceop.html`, only the
+# files whose content changed are written
+echart.write_if_changed(echart_dir + "/sliceop_data.js",
+                        echart.js_assign("datain", sliceop_data)
+                        + "".join([echart.js_series('datain["' + k + '"]',
+                                                    clim_data[k], compact)
+                                   for k in clim_data]))
+echart.write_if_changed(echart_dir + "/sliceop_files.js",
+                        echart.js_assign("seasonFiles", season_files))
+echart.write_if_changed(echart_dir + "/colormap.js",
+                        echart.js_assign("color", colormap))
+echart.write_if_changed(echart_dir + "/fuds.js",
+                        echart.js_assign("fud", fuds))
+echart.write_if_changed(echart_dir + "/latest.json", json.dumps(latest))
 if frozen:
-    with open(path + '/echart/frozen.js', 'w') as fp:
-        fp.write("frozen=true")
+    echart.write_if_changed(echart_dir + "/frozen.js", "frozen=true")
 else:
-    with open(path + '/echart/frozen.js', 'w') as fp:
-        fp.write("frozen=false")
+    echart.write_if_changed(echart_dir + "/frozen.js", "frozen=false")
@@ -21,20 +21,9 @@ fi
 source $(echo $SLICEOP_CONDA_PATH)
 conda activate sliceop
 
-# make sure 'preproy' is False, indicating that the yearly preprocessing was not
-# succesful (will be set to True within yearly_preprocess.py if succesful)
-echo False > ${local_path}/prepro/preproy
-# load boolean 'updatey' which should be True if the necessary downloads to run
-# the yearly preprocessing were succesful
-updatey=$(cat ${local_path}/downloads/updatey)
-printf "\nPreprocessing:\n"
-# run preprocessing if 'updatey' is True
-if [[ $updatey == True ]]; then
-    python ${local_path}/prepro/yearly_preprocess.py
-else
-    printf "No preprocessing performed because SEAS5.1 and/or ERA5 could not"\
-           " be updated.\n"
-fi
+# run all steps of the yearly schedule in one python process, the steps and the
+# flag files deciding which of them run are defined in sliceop/schedules.py
+PYTHONPATH=${local_path} python -m sliceop run yearly
 
 echo " "
 echo "-----------------------------------"
@@ -12,13 +12,13 @@ import os
 import sys
 import datetime
 import numpy as np
-import xarray as xr
-import pandas as pd
-from sklearn.linear_model import LinearRegression
 
 # define path
 now = datetime.datetime.now()
 path = os.environ["SLICEOP_PATH"]
+# objects handed over in memory by the pipeline runner (sliceop/pipeline.py),
+# empty when the script is run on its own
+handoff = globals().get("handoff", {})
 
 # if running TEST, take year, month, day from environment variables
 # otherwise extract year, month, day from `datetime.datetime.now
@@ -39,133 +39,46 @@ if month in ["01", "02", "03", "04"]:
 elif month in ["05", "06"]:
     sys.exit("Nothing to do in May and June")
 
-# define names of variables to use for the forecast
-variables = ["2m_temperature", "snowfall", "total_cloud_cover"]
+# import the heavy dependencies only now that there is something to do, and
+# make the shared modules in SLICEop/sliceop importable
+import xarray as xr
+sys.path.append(path)
+from sliceop import forecast, model, registry
 
-# define to use linear regression as the forecast model
-model = LinearRegression()
+# names of the variables to use for the forecast, see `predictors.json`
+variables = registry.load(path).names
 
-# load input data
-input_forecast = xr.open_dataset(path + "/prepro/input_forecast_weekly.nc")
-# for the ensemble mean forecast, only keep variables with "_m" at the end of
-# the name
-input_forecast_m = input_forecast.drop_vars(
-    [v for v in variables if v in input_forecast.variables]
-    )
-# load the monthly predictors (created in 'yearly_preprocess.py')
-predictors = xr.open_dataset(path + "/prepro/monthly_predictors.nc")
+# load input data, unless the preprocessing handed it over in memory
+if "input_forecast" in handoff:
+    input_forecast = handoff["input_forecast"]
+else:
+    input_forecast = xr.open_dataset(path + "/prepro/input_forecast_weekly.nc")
 
-# convert predictors do dataframe in preparation for the forecast
-predictor_frame = predictors[[v for v in variables]].to_dataframe()
-# create a dataframe for the ensemble mean forecast
-predictor_frame_m = predictors.rename(
-    {v: v + "_m" for v in variables}
-    )[[v + "_m" for v in variables]].to_dataframe()
-# run the ensemble mean forecast
-forecast_m = model.fit(
-    predictor_frame_m, predictors.FUDoy
-    ).predict(
-    input_forecast_m.expand_dims({"time": 1}).to_dataframe()
-    )
+# load the linear regression fitted on the monthly predictors (by
+# 'yearly_preprocess.py'), it is only refitted if the monthly predictors
+# changed since. the ensemble mean and the members share the same model
+coef, intercept = model.get_model(path + "/prepro/monthly_predictors.nc",
+                                  variables)
+# forecast the ensemble mean (first row) and, if the input data contains
+# several ensemble members, each of the members in one go. if not all of the
+# variables are available from each ensemble member, the ensemble mean is used
+# this mostly applies to ERA5 data, which has no ensemble members and the data
+# is treated as "ensemble mean"
+forecasts = forecast.predict(coef, intercept,
+                             forecast.member_matrix(input_forecast, variables))
 
 y = int(year)
-# convert forecasted dayofyear to a date
-if forecast_m[0] > 365:
-    forecast_date_m = np.datetime64(
-        str(y+1) + "-01-01"
-        ) + np.timedelta64(
-        int(np.around(forecast_m[0]-366))
-        )
-else:
-    # taking into account leap years (for the forecast, all years are
-    # considered to have 365 days, i.e. dayofyear 360 is always Dec. 26)
-    if y % 4 == 0 and (y % 100 != 0 or y % 400 == 0):
-        forecast_date_m = np.datetime64(
-            str(y) + "-01-01"
-            ) + np.timedelta64(
-            int(np.around(forecast_m[0]))
-            )
-    else:
-        forecast_date_m = np.datetime64(
-            str(y) + "-01-01"
-            ) + np.timedelta64(
-            int(np.around(forecast_m[0]-1))
-            )
+# convert forecasted dayofyear of the ensemble mean to a date
+forecast_date_m = forecast.doy_to_date(forecasts[0], y)
 
-# write ensemble mean forecast to file. the format is
+# write all forecasts to file at once. the format is
 # 'date forecast is issued', 'ensemble member', 'forecasted dayofyear'
 # the ensemble mean is member '0'
 # forecasted freeze-up dayofyears are rounded to the nearest integer number
-# if output file for the current year is already present, append
-if os.path.isfile(path + "/auto/" + year + "FUDweekly"):
-    with open(path + "/auto/" + year + "FUDweekly", "a") as f:
-        f.write("\n" + oy + "-" + month + "-" + day + ",0,"
-                + str(int(np.around(forecast_m[0]))))
-    f.close()
-# if output file is not present, create it and add header line
-else:
-    with open(path + "/auto/" + year + "FUDweekly", "a") as f:
-        f.write("time,number,FUD\n" + oy + "-" + month + "-" + day + ",0,"
-                + str(int(np.around(forecast_m[0]))))
-    f.close()
-
-# if the input data contains several ensemble members, run the forecast for
-# each of the members
-if "number" in input_forecast.dims:
-    # loop over members
-    for n in np.arange(0, len(input_forecast.number)):
-        tmp = input_forecast.isel(number=n)
-        # if not all of the variables are available from each ensemble member,
-        # use the ensemble mean
-        # this mostly applies to ERA5 data, which has no ensemble members and
-        # the data is treated as "ensemble mean"
-        for v in variables:
-            if not v in tmp.variables:
-                tmp = tmp.rename({v + "_m": v})
-            if v + "_m" in tmp.variables:
-                tmp = tmp.drop_vars(v + "_m")
-        # run the forecast
-        forecast = model.fit(
-            predictor_frame, predictors.FUDoy
-            ).predict(
-            tmp.expand_dims({"time": 1}).to_dataframe()
-            )
-        # convert forecasted dayofyear to a date
-        if forecast[0] > 365:
-            forecast_date = np.datetime64(
-                str(y+1) + "-01-01"
-                ) + np.timedelta64(
-                int(np.around(forecast[0]-366))
-                )
-        # taking into account leap years (for the forecast, all years are
-        # considered to have 365 days, i.e. dayofyear 360 is always Dec. 26)
-        else:
-            if y % 4 == 0 and (y % 100 != 0 or y % 400 == 0):
-                forecast_date = np.datetime64(
-                    str(y) + "-01-01"
-                    ) + np.timedelta64(
-                    int(np.around(forecast[0]))
-                    )
-            else:
-                forecast_date = np.datetime64(
-                    str(y) + "-01-01"
-                    ) + np.timedelta64(
-                    int(np.around(forecast[0]-1))
-                    )
-        # write each members forecast to file. the format is
-        # 'date forecast is issued', 'ensemble member', 'forecasted dayofyear'
-        # forecasted freeze-up dayofyears are rounded to the nearest
-        # integer number
-        # if output file for the current year is already present, append
-        if os.path.isfile(path + "/auto/" + year + "FUDweekly"):
-            with open(path + "/auto/" + year + "FUDweekly", "a") as f:
-                f.write("\n" + oy + "-" + month + "-" + day + ","
-                        + str(n+1) + "," + str(int(np.around(forecast[0]))))
-            f.close()
-        # do not write the ensemble members if the ensemble mean didn't work
-        # something went wrong
-        else:
-            sys.exit("Output of ensemble mean forecast not written, exiting.")
+# if output file for the current year is already present, append, otherwise
+# create it and add header line
+forecast.write_forecasts(path + "/auto/" + year + "FUDweekly",
+                         oy + "-" + month + "-" + day, forecasts)
 
 # save information on whether the forecast was succesful or not
 with open(path + "/auto/forecastw", "w") as f:
@@ -173,4 +86,4 @@ with open(path + "/auto/forecastw", "w") as f:
 f.close()
 
 print("The forecasted freezup of the St. Lawrence is " + str(forecast_date_m)
-      + "\n day " + str(int(np.around(forecast_m[0]))) + " of the year")
+      + "\n day " + str(int(np.around(forecasts[0]))) + " of the year")
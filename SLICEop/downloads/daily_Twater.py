@@ -10,40 +10,27 @@ on the temperature data. If the water temperature at the treatment plant is
 below 0.75 deg. Celsius, the river is assumed to be frozen.
 
 '''
-import pandas as pd
-import xarray as xr
 import numpy as np
 import os
-import time
 import datetime
-import csv
 import sys
 
 # path to SLICEop
 path = os.environ["SLICEOP_PATH"]
 thermistor_path = os.environ["SLICEOP_THERMISTOR_PATH"]
+backup_path = os.environ["SLICEOP_BACKUP_PATH"]
+twater = path + "/downloads/Twater/Twater_Longueuil_updated.nc"
 
-# function to read data from thermistor (works for files newer than
-# Longueuil.dat4860.dat, before that the format was different)
-def read_thermistor_new(inputfile):
-    # read thermistor data and convert to xarray, define dimension names
-    tmp = pd.read_csv(inputfile, sep=",",  header=None,
-        quoting=csv.QUOTE_ALL).to_xarray().rename({0: "Date",
-            2: "T"}).drop_vars((1, 3, 4, 5))
-    # set Date as coordinate and add it as an index
-    tmp = tmp.set_coords("Date")
-    tmp["Date"] = pd.DatetimeIndex(tmp['Date'].values)
-    # replace bad values with NaN
-    tmpT = tmp.T.data
-    replace = [np.nan if tmpT[i] == 'Bad' else float(tmpT[i])
-               for i in range(0, len(tmpT))]
-    tmp["T"] = ("Date", replace)
-    # clean up dataset an return
-    return tmp.drop_vars("index").sortby("Date")
+# make the shared modules in SLICEop/sliceop importable
+sys.path.append(path)
+from sliceop.thermistor import read_thermistor_new, DailyAccumulator
+from sliceop import seasonmatrix, store
 
-# load existing temperature record
-ds_in = xr.open_dataset(path + "/downloads/Twater/Twater_Longueuil_updated.nc")
-# get lowest suffix for temperature data to be added to ds_in
+# the temperature record is an append-only store with an unlimited Date
+# dimension, only the last stored day is needed to know where to continue
+store.ensure_unlimited(twater)
+lastday = store.read_tail(twater)[0][-1]
+# get lowest suffix for temperature data to be added to the record
 with open(path + "/downloads/Twater/next.i", "rb") as f:
     lowest_i = int(f.read())
 f.close()
@@ -54,84 +41,75 @@ print("Adding new data to Twater_Longueuil_updated.nc,"
 now = np.datetime64(datetime.datetime.now())
 yesterday = np.datetime64(np.datetime_as_string(now - np.timedelta64(1, "D"),
                           unit='D') + "T23:59:59")
-# the last day in ds_in + 1 is the first should be the first day that is added
-firstday = ds_in.Date.isel(Date=-1) + np.timedelta64(1, "D")
+# the last stored day + 1 is the first should be the first day that is added
+firstday = lastday + np.timedelta64(1, "D")
 # compute difference between yesterday and first day to be added
 # if this is 0, there is no new day to be added
-tds = float((yesterday - firstday).values) / 1e9
+tds = (yesterday - firstday) / np.timedelta64(1, "s")
 # load data from thermistor
 i = lowest_i
 if tds > 0:
+    # the 1-minute data of each file is folded into daily averages right
+    # away (including the quality control), so only one day of data is kept
+    # in memory no matter how many files need to be added
+    daily = DailyAccumulator()
     # read new temperature data from thermistor
     try:
-        da_update = read_thermistor_new(thermistor_path + "/Longueuil.dat"
-                                        + str(i) + ".dat")
+        times, values = read_thermistor_new(thermistor_path + "/Longueuil.dat"
+                                            + str(i) + ".dat")
     except:
         sys.exit("No additional temperature data found.")
+    daily.add(times, values)
     i += 1
     # add new data until the most recent file
     while os.path.isfile(thermistor_path + "/Longueuil.dat" + str(i) + ".dat"):
         try:
-            tmp = read_thermistor_new(thermistor_path + "/Longueuil.dat"
-                                      + str(i) + ".dat")
+            times, values = read_thermistor_new(thermistor_path
+                                                + "/Longueuil.dat" + str(i)
+                                                + ".dat")
         except:
-            # if there is an error of some sort, we will add a NaN to the
-            # time series
-            tmp["Date"] = tmp["Date"] + np.timedelta64(1, "h")
-            tmp["T"] = np.nan
+            # if there is an error of some sort, we skip the file, the gap is
+            # filled by interpolation within the daily average
+            i += 1
+            continue
         # do not add data from today
-        if tmp.Date.isel(Date=-1) <= yesterday:
-            da_update = xr.concat((da_update, tmp), dim="Date",
-                                  coords="minimal", compat="override")
+        if len(times) == 0 or times.max() <= yesterday:
+            daily.add(times, values)
             i += 1
         else:
             break
-    # save the last suffix added to da_update so that we can restart from there
-    # the day after
+    # complete the last day
+    daily.flush()
+    # save the last suffix added to the daily averages so that we can restart
+    # from there the day after
     with open(path + "/downloads/Twater/next.i", "w") as f:
         f.write(str(i))
     f.close()
 else:
     print("No full day of temperature data available since "
-          + str(ds_in.Date.isel(Date=-1).values))
+          + str(lastday))
     sys.exit("Exiting daily_Twater.py")
 
-# drop duplicate values on time axis
-da_update = da_update.sortby("Date").drop_duplicates(dim="Date")
-# run a quick smoothing to exclude outliers before computing the daily average
-update_smooth = da_update.copy()
-# if the temperature changes more than 1 degree per hour, is larger than
-# 30 degrees or deviates more than 3 degrees from the climatological average
-# of its daym it is considered an outlier and we replace it with an
-# interpolated value
-dTdt_ok = np.abs(da_update["T"].ffill(dim="Date").differentiate("Date",
-             datetime_unit="h")) < 1.0
-update_smooth["T"] = da_update.T.where(dTdt_ok & (da_update.T < 30.),
-                                       other=np.nan)
-tmp = update_smooth.copy()
-tmp = tmp.assign_coords(year_month_day = tmp.Date.dt.strftime("%Y-%m-%d"))
-deviation = (tmp.groupby("year_month_day") -
-             tmp.groupby("year_month_day").mean("Date"))
-update_smooth["T"] = update_smooth.T.where(deviation.T < 3.,
-                         other=np.nan).interpolate_na(dim="Date")
-# compute daily average from hourly data and concatenate them to the
-# existing data in ds_in
-updated = xr.concat([ds_in,
-    update_smooth.sortby("Date").resample(Date="1D").mean(dim="Date")],
-    dim="Date", compat="override", coords="minimal")
-# make sure Date is in ascending order and there are no duplicate dates
-updated = updated.sortby("Date").drop_duplicates(dim="Date").compute()
-# save updated dataset
-ds_in.close()
-updated.to_netcdf(path + "/downloads/Twater/Twater_Longueuil_updated.nc",
-                  mode="w")
+# append the new daily averages to the record, only the new days are written
+dates, means = daily.result()
+store.append_days(twater, dates, means)
+# update the backup with the appended days
+try:
+    store.backup(twater, backup_path)
+except Exception as e:
+    print("Backup of Twater_Longueuil_updated.nc failed: " + str(e))
+# write the appended days into the season matrix used by the daily plots
+prepro = path + "/prepro/Twater_Longueuil_preprocessed.nc"
+if os.path.isfile(prepro):
+    seasonmatrix.update_season_matrix(prepro, twater, dates, means)
 # save info on whether data was updated
 with open(path + "/downloads/Twater/updated", "w") as f:
     f.write(str("True"))
 f.close()
 # check if St. Lawrence is already frozen, if it is below 0.75 deg. Celsius
 # we consider it frozen
-if updated.T.isel(Date=-1).values < 0.75:
+last_date, last_T = store.read_tail(twater)
+if last_T[-1] < 0.75:
     with open(path + "/auto/frozen", "r") as f:
         frozen = f.read()
     f.close()
@@ -140,7 +118,7 @@ if updated.T.isel(Date=-1).values < 0.75:
     # write that date to a file
     if frozen == "False":
         with open(path + "/auto/frozenDate", "w") as f:
-            f.write(str(updated.Date.isel(Date=-1).values)[0:10])
+            f.write(str(last_date[-1])[0:10])
         f.close()
         with open(path + "/auto/frozen", "w") as f:
             f.write(str("True"))
@@ -152,7 +152,10 @@ combined = xr.merge([combined, da_2024_12_17])
 # saved to a updated file.
 combined.to_netcdf(path + "/downloads/Twater/Twater_Longueuil_permanent.nc")
 # The file for the updated dataset contains the same as the permanent for now.
-combined.to_netcdf(path + "/downloads/Twater/Twater_Longueuil_updated.nc")
+# Its Date dimension is unlimited so that `daily_Twater.py` can append new days
+# without rewriting the file.
+combined.to_netcdf(path + "/downloads/Twater/Twater_Longueuil_updated.nc",
+                   unlimited_dims=["Date"])
 # From 2024-12-18 onward thermistor data has a timestamp and we can easliy add
 #it to existing files. The first to add is file number
 # 4860, we save that number to the file `next.i` for the daily updating script
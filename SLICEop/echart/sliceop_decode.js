@@ -0,0 +1,18 @@
+// decode a compact payload written by daily_prepare_data_for_echart.py: the
+// values are little-endian int16 in units of 10^-digits, encoded in base64,
+// and 'missing' marks values that are not available (NaN)
+function decodeSeries(payload) {
+    var binary = atob(payload.data);
+    var bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+        bytes[i] = binary.charCodeAt(i);
+    }
+    var view = new DataView(bytes.buffer);
+    var scale = Math.pow(10, payload.digits);
+    var values = new Array(bytes.length / 2);
+    for (let i = 0; i < values.length; i++) {
+        var v = view.getInt16(2 * i, true);
+        values[i] = (v === payload.missing) ? NaN : v / scale;
+    }
+    return values;
+}
@@ -6,10 +6,9 @@ freeze-up date with the values from the last winter season.
 '''
 import os
 import sys
+import glob
 import datetime
 import numpy as np
-import xarray as xr
-import pandas as pd
 
 # define path
 now = datetime.datetime.now()
@@ -28,6 +27,12 @@ else:
 if month != "07":
     sys.exit("This script should run in July, something went wrong.")
 
+# import the heavy dependencies only now that there is something to do, and
+# make the shared modules in SLICEop/sliceop importable
+import xarray as xr
+sys.path.append(path)
+from sliceop import climatology, model, predictors, qc, registry, seasons
+
 #### water temperature Tw
 ### remove periods of constant T (unless T is near the freezing point)
 # load daily average water temperature data
@@ -38,24 +43,18 @@ dTwdt = Tw["T"].ffill(dim="Date").differentiate("Date", datetime_unit="2D")
 d2Twdt2 = dTwdt.differentiate("Date", datetime_unit="2D")
 # if dT / dt stays below 0.1 degrees / day for at least 7 days AND T is
 # greater than 2 degrees, replace T by NaN
-Tw_const = pd.Series((np.abs(dTwdt) < 0.1) * (Tw.T > 2))
-for _,x in Tw_const[Tw_const].groupby((1-Tw_const).cumsum()):
-    diff = x.index[-1] - x.index[0]
-    if diff >= 6:
-        if x.index[-1] < len(Tw_const)-1:
-            Tw_processed[x.index[0]:x.index[-1]+1] = np.nan
-        else:
-            Tw_processed[x.index[0]::] = np.nan
+Tw_const = ((np.abs(dTwdt) < 0.1) & (Tw.T > 2)).values
+Tw_processed[qc.long_runs(Tw_const, 7)] = np.nan
 # filter sharp jumps
 jump = np.abs(d2Twdt2) > (np.abs(d2Twdt2).mean(skipna=True)
                           + (d2Twdt2.std(skipna=True)))
 Tw_processed[jump] = np.nan
 # filter high values: fill in NaN whenever temperature is more than
 # 5 standard deviations away from the climatology
-Tw_mean = Tw_processed.groupby("Date.dayofyear").mean("Date", skipna=True)
-Tw_std = Tw_processed.groupby("Date.dayofyear").std("Date", skipna=True)
-high = (np.abs(Tw_processed.groupby("Date.dayofyear") - Tw_mean)
-        > (5 * Tw_std.mean()))
+Tw_doy = Tw_processed.Date.dt.dayofyear.values
+Tw_mean, Tw_std = climatology.dayofyear_moments(Tw_doy, Tw_processed.values)
+high = (np.abs(Tw_processed.values - Tw_mean[Tw_doy])
+        > (5 * np.nanmean(Tw_std)))
 Tw_processed[high] = np.nan
 # set negative to 0
 Tw_processed[Tw_processed < 0] = 0
@@ -74,29 +73,13 @@ Tw_winter = Tw_processed.copy()
 Tw_winter[Tw_winter > 2] = np.nan
 Tw_winter[np.abs(dTwdt) > 0.1] = np.nan
 Tw_winter[np.abs(d2Twdt2) > 0.1] = np.nan
-# compute the mean over each winter season
-Tw_winter_mean = Tw_winter.resample(Date='QS-DEC').mean(dim="Date",
-                                                        skipna=True)[0::4]
-# offest Date to be in middle of winter
-Tw_winter_mean["Date"] = Tw_winter_mean.Date + np.timedelta64(45,'D')
-# compute the temperature offest for each winter season
+# compute the mean over each winter season (Dec. - Feb.) and assign it to
+# December from year-1 and January - April from year, all winters are
+# computed in one pass
 Tw_offset = xr.zeros_like(Tw_winter) + np.nan
+Tw_offset[:] = seasons.winter_offset(Tw_winter.Date.values, Tw_winter.values)
 y_min = Tw_offset.Date.dt.year.values.min()
 y_max = Tw_offset.Date.dt.year.values.max()
-for y in np.arange(y_min, y_max+1):
-    # use December from year-1 and January+February from year ot compute winter
-    # offest, unless in the first year, where only January and February are used
-    if y != y_min:
-        Tw_offset = xr.where(((Tw_offset.Date.dt.year == y-1) &
-                              (Tw_offset.Date.dt.month == 12)),
-                             Tw_winter_mean.sel(Date=str(y) + "-01-15",
-                                                method="nearest").values,
-                             Tw_offset)
-    Tw_offset = xr.where(((Tw_offset.Date.dt.year == y) &
-                          ((Tw_offset.Date.dt.month >= 1) &
-                          (Tw_offset.Date.dt.month <= 4))),
-                         Tw_winter_mean.sel(Date=str(y) + "-01-15",
-                                            method="nearest").values, Tw_offset)
 Tw_offset = Tw_offset.dropna(dim="Date").interp(Date=Tw_winter.Date)
 # remove the computed offest from the temperature
 Tw_no_offset = Tw_processed - Tw_offset
@@ -145,53 +128,40 @@ print("saving FUD")
 FUD.to_netcdf(path + "/prepro/FUD_preprocessed.nc")
 
 #### ERA5 data - monthly predictors
-# define variable names, short names, months and which method to use to
-# compute them (monthly mean or monthly integral)
-variables = ["2m_temperature", "snowfall", "total_cloud_cover"]
-short_vars = ["t2m", "sf", "tcc"]
-months = ["12", "11", "09"]
-method = ["mean", "sum", "mean"]
+# variable names, short names, months and which method to use to compute
+# them (monthly mean or monthly integral) are defined in `predictors.json`
+registered = registry.load(path)
+names = registered.names
+variables = registered.variables
+short_vars = registered.short_vars
+months = registered.months
+method = registered.methods
+# the monthly predictor of each year is computed only once and kept in a
+# table together with the size and modification time of its ERA5 file, so only
+# new (or replaced) files need to be decoded and reduced
+table_file = path + "/prepro/monthly_predictors_table.csv"
+table = predictors.load_table(table_file)
 # initialize dataset
 monthly_predictors = xr.Dataset()
 # loop over the variables and
 for v in range(0, len(variables)):
-    # load dataset
-    try:
-        era5 = xr.open_mfdataset(path + "/downloads/ERA5/ERA5_????" + months[v] + "_" + variables[v] + ".grib",
-                                 engine="cfgrib", decode_timedelta=True, backend_kwargs={"indexpath": ""})
-    except:
+    files = sorted(glob.glob(path + "/downloads/ERA5/ERA5_????" + months[v]
+                             + "_" + variables[v] + ".grib"))
+    if len(files) == 0:
         sys.exit("No ERA5 data found to load.")
-    # handle different time dimension names
-    if era5.step.size > 1:
-        era5 = era5.rename({"time": "old_time"}).stack(time=("old_time",
-            "step")).reset_index(["old_time", "step"]).drop_vars(["old_time",
-                "step"])
-        era5["time"] = era5["valid_time"]
-        era5 = era5.drop_vars(["valid_time"])
-    else:
-        era5 = era5.drop_vars(["step"])
-        era5["time"] = era5["valid_time"]
-        era5 = era5.drop_vars(["valid_time"])
-    # convert temperature to Celsius if in Kelvin
-    if ((short_vars[v] == "t2m") & (era5[short_vars[v]].units == "K")):
-        era5[short_vars[v]] = era5[short_vars[v]] - 273.15
-    # sum all the values in the month if method is "sum"
-    if method[v] == "sum":
-        era5["time"] = era5["time"] - np.timedelta64(30, "m")
-        tmp  = era5.mean(("longitude",
-            "latitude")).resample(time="1ME").sum("time")[short_vars[v]][1::12]
-        tmp["time"] = tmp["time"].values.astype(
-                          "datetime64[Y]").astype(int) + 1970
-        monthly_predictors[variables[v]] = tmp
-    # compute monthly mean if method is "mean"
-    elif method[v] == "mean":
-        tmp = era5.mean(("longitude",
-            "latitude")).resample(time="1ME").mean("time")[short_vars[v]][0::12]
-        tmp["time"] = tmp["time"].values.astype(
-                          "datetime64[Y]").astype(int) + 1970
-        monthly_predictors[variables[v]] = tmp
-    else:
-        sys.exit("No method (sum or mean) specified")
+    # the year is part of the filename, ERA5_YYYYMM_<variable>.grib
+    years = [int(os.path.basename(f)[5:9]) for f in files]
+    for y, f in zip(years, files):
+        try:
+            predictors.reduce_file(table, names[v], y, f, short_vars[v],
+                                   months[v], method[v])
+        except ValueError as e:
+            sys.exit(str(e))
+        except:
+            sys.exit("No ERA5 data found to load.")
+    monthly_predictors[names[v]] = predictors.predictor_series(
+        table, names[v], years)
+predictors.save_table(table, table_file)
 
 # find common period of FUD and ERA5
 # they should be the same but in case they are not we can still run a forecast
@@ -205,8 +175,11 @@ end = min(FUD_end, ERA5_end)
 # combine all data into one dateset with monthly values
 monthly_predictors = monthly_predictors.sel(time=slice(start, end + 1))
 monthly_predictors["FUDoy"] = FUD.FUDoy.sel(time=slice(start, end + 1))
-monthly_predictors.drop_vars(["number", "surface"]).to_netcdf(
+monthly_predictors.drop_vars(["number", "surface"], errors="ignore").to_netcdf(
     path + "/prepro/monthly_predictors.nc")
+# fit the forecast model on the new monthly predictors and store it for the
+# weekly and monthly forecasts
+model.fit_model(path + "/prepro/monthly_predictors.nc", names)
 # save information on whether the preprocessing was succesful or not
 with open(path + "/prepro/preproy", "w") as f:
     f.write(str("True"))
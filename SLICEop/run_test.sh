@@ -6,36 +6,15 @@ else
   local_path=$(echo $SLICEOP_PATH)
 fi
 
-# need to temporarily move the ERA5 data elsewhere so that
-# SLICEop thinks it is not available for the testing
+# load conda environment
+source $(echo $SLICEOP_CONDA_PATH)
+conda activate sliceop
 
-mv ${local_path}/downloads/ERA5 ${SLICEOP_BACKUP_PATH}/
-mkdir ${local_path}/downloads/ERA5
-
-export TEST=True
-d=1992-06-01
-while [ "$d" != 2025-03-31 ]; do
-    year=$(date -d "$d" +%Y)
-    month=$(date -d "$d" +%m)
-    dom=$(date -d "$d" +%d)
-    weekday=$(date -d "$d" +%u)
-    export YEAR="$year"; export MONTH="$month"; export DAY="$dom"
-    if [[ "$month" == "06" && "$dom" == "10" ]]; then
-        echo $d
-        echo "False" > ${local_path}/auto/frozen
-    fi
-    if [[ "$dom" == "07" ]]; then
-        echo $d
-        ${local_path}/auto/run_monthly.sh
-    fi
-    if [[ "$weekday" == "1" ]]; then
-        echo $d
-        ${local_path}/auto/run_weekly.sh
-    fi
-    d=$(date -I -d "$d + 1 day")
-done
-
-rm -r ${local_path}/downloads/ERA5
-mv ${SLICEOP_BACKUP_PATH}/ERA5 ${local_path}/downloads/
-
-export TEST=False
+# replay the weekly and monthly forecasts of every Monday and every 7th (see
+# sliceop/replay.py) and write them to the YYYYFUDweekly and YYYYFUDmonthly
+# files in auto. the data each forecast would have used is derived from its
+# date, so the ERA5 data does not need to be moved aside. the data that is
+# missing is downloaded first (--download), the seasons are replayed in
+# parallel by one process per core (set their number with --workers)
+PYTHONPATH=${local_path} python -m sliceop hindcast 1992-06-01 2025-03-30 \
+  --download
@@ -0,0 +1,7 @@
+''' sliceop
+
+Modules shared by the scripts in SLICEop/auto, SLICEop/downloads and
+SLICEop/prepro. The scripts make them importable by adding `SLICEOP_PATH` to
+`sys.path`.
+
+'''
@@ -0,0 +1,139 @@
+''' sliceop
+
+Entry point running one of the SLICEop schedules in a single process:
+
+    python -m sliceop run daily|weekly|monthly|yearly [--in-memory]
+
+With `--in-memory` the preprocessed input of the forecast is handed to the
+forecast without writing it to `prepro`. The forecasts of past seasons are
+replayed (see `replay.py`) with
+
+    python -m sliceop replay START END [--workers N] [--output FILE]
+                                       [--download]
+
+and written to the per-season `YYYYFUDweekly` and `YYYYFUDmonthly` files,
+with one process per core by default, with
+
+    python -m sliceop hindcast START END [--workers N] [--directory DIR]
+                                         [--download]
+
+The cross-validated skill of the regression on each combination of the
+predictors in `prepro/monthly_predictors.nc` (see `skill.py`) is reported by
+
+    python -m sliceop skill [--folds K] [--output FILE]
+
+and other candidate predictors (variables, months and regions of ERA5) are
+screened (see `screening.py`) with
+
+    python -m sliceop screen [--variables VAR ...] [--months MM ...]
+                             [--regions NAME=SOUTH,NORTH,WEST,EAST ...]
+                             [--max-size N] [--folds K] [--workers N]
+                             [--top N] [--output FILE] [--download]
+
+`SLICEOP_PATH` (and the other variables in `setup.sh`) need to be set and
+`SLICEOP_PATH` needs to be the working directory or be on `PYTHONPATH`.
+
+'''
+import os
+import argparse
+import datetime
+
+from sliceop import schedules
+
+parser = argparse.ArgumentParser(prog="python -m sliceop")
+subparsers = parser.add_subparsers(dest="command", required=True)
+run_parser = subparsers.add_parser("run", help="run one of the schedules")
+run_parser.add_argument("schedule", choices=list(schedules.SCHEDULES))
+run_parser.add_argument("--in-memory", action="store_true",
+                        help="do not write intermediate results to disk")
+replay_parser = subparsers.add_parser(
+    "replay", help="replay the forecasts issued from START to END")
+replay_parser.add_argument("start", type=datetime.date.fromisoformat)
+replay_parser.add_argument("end", type=datetime.date.fromisoformat)
+replay_parser.add_argument("--workers", type=int, default=1,
+                           help="number of seasons replayed in parallel")
+replay_parser.add_argument("--output", default=None,
+                           help="results table, default auto/replay.csv")
+replay_parser.add_argument("--download", action="store_true",
+                           help="download the missing ERA5 and SEAS5.1 data")
+hindcast_parser = subparsers.add_parser(
+    "hindcast", help="replay the forecasts issued from START to END and "
+                     "write them to the per-season files")
+hindcast_parser.add_argument("start", type=datetime.date.fromisoformat)
+hindcast_parser.add_argument("end", type=datetime.date.fromisoformat)
+hindcast_parser.add_argument("--workers", type=int, default=None,
+                             help="number of seasons replayed in parallel, "
+                                  "default one per core")
+hindcast_parser.add_argument("--directory", default=None,
+                             help="directory of the files, default auto")
+hindcast_parser.add_argument("--download", action="store_true",
+                             help="download the missing ERA5 and SEAS5.1 "
+                                  "data")
+skill_parser = subparsers.add_parser(
+    "skill", help="cross-validate the regression on the monthly predictors")
+skill_parser.add_argument("--folds", type=int, default=5,
+                          help="number of folds of the k-fold forecasts")
+skill_parser.add_argument("--output", default=None,
+                          help="also write the skill table to this file")
+screen_parser = subparsers.add_parser(
+    "screen", help="cross-validate combinations of candidate predictors")
+screen_parser.add_argument("--variables", nargs="+", default=None,
+                           help="default the variables of predictors.json")
+screen_parser.add_argument("--months", nargs="+", default=None,
+                           help="default the first to the last month of "
+                                "the predictors in predictors.json")
+screen_parser.add_argument("--regions", nargs="+", default=[],
+                           help="regions within the downloaded area as "
+                                "NAME=SOUTH,NORTH,WEST,EAST, default the "
+                                "whole area")
+screen_parser.add_argument("--max-size", type=int, default=3,
+                           help="largest number of predictors combined")
+screen_parser.add_argument("--folds", type=int, default=5,
+                           help="number of folds of the k-fold forecasts")
+screen_parser.add_argument("--workers", type=int, default=None,
+                           help="number of processes, default one per core")
+screen_parser.add_argument("--top", type=int, default=20,
+                           help="number of combinations printed")
+screen_parser.add_argument("--output", default=None,
+                           help="skill table, default prepro/screening.csv")
+screen_parser.add_argument("--download", action="store_true",
+                           help="download the missing ERA5 data")
+args = parser.parse_args()
+
+if args.command == "run":
+    schedules.run(args.schedule, materialize=not args.in_memory)
+elif args.command == "replay":
+    # only import the replay (and xarray) when it is used
+    from sliceop import replay
+    replay.run(os.environ["SLICEOP_PATH"], args.start, args.end,
+               workers=args.workers, output=args.output,
+               fetch=args.download)
+elif args.command == "hindcast":
+    from sliceop import replay
+    replay.hindcast(os.environ["SLICEOP_PATH"], args.start, args.end,
+                    workers=args.workers, directory=args.directory,
+                    fetch=args.download)
+elif args.command == "skill":
+    import xarray as xr
+    from sliceop import skill
+    with xr.open_dataset(os.environ["SLICEOP_PATH"]
+                         + "/prepro/monthly_predictors.nc") as predictors:
+        variables = [v for v in predictors.data_vars if v != "FUDoy"]
+        table = skill.evaluate(predictors, variables, k=args.folds)
+    print(table.to_string(index=False, float_format="{:.2f}".format))
+    if args.output is not None:
+        table.to_csv(args.output, index=False)
+elif args.command == "screen":
+    from sliceop import screening
+    regions = None
+    if args.regions:
+        regions = {}
+        for region in args.regions:
+            name, box = region.split("=")
+            regions[name] = tuple(float(b) for b in box.split(","))
+    table = screening.run(os.environ["SLICEOP_PATH"], args.variables,
+                          args.months, regions, max_size=args.max_size,
+                          k=args.folds, workers=args.workers or os.cpu_count(),
+                          output=args.output, fetch=args.download)
+    print(table.head(args.top).to_string(index=False,
+                                         float_format="{:.2f}".format))
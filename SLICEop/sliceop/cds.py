@@ -0,0 +1,386 @@
+''' cds
+
+Download manager for the Climate Data Store (CDS). The download scripts add
+all the files they need with `Downloader.add` and then fetch them with
+`Downloader.run`. Since the time of a CDS download is dominated by the time a
+request waits in the CDS queue, the requests are submitted concurrently by a
+bounded pool of threads (`max_workers`) sharing a single client. Each thread
+submits its request without waiting for it, polls its state with an
+increasing interval and downloads the result once it is complete.
+
+The IDs of the submitted requests are kept in `downloads/cds_requests.json`
+until their result is downloaded, so that a download script that is
+interrupted (or killed by cron) picks up the requests that are still queued
+or running at the CDS instead of submitting them again. Results are
+downloaded to a temporary file first, so a file that is present is always
+complete.
+
+Downloads that only differ in their year and variable are coalesced into
+batches by `plan`: the ERA5 API accepts lists of years and variables, so e.g.
+the 3 variables x ~33 years of the initial download become a few requests of
+up to `max_years` years each, with one queue wait each instead of one per
+file. The GRIB file returned for a batch is split back into the usual
+`ERA5_YYYYMM_<var>.grib` files by `split_grib`.
+
+The client only needs the methods `submit`, `state` and `download` of
+`CDSClient`, which wraps the `ecmwf-datastores` client that `cdsapi` (0.7.x)
+uses for the current CDS. Requests of an earlier run are looked up by their
+ID with that client. Any other object with these methods (e.g. a stub of the
+CDS) can be passed to `Downloader` instead. A request that is not complete
+after `timeout` seconds is given up for this run but kept in
+`cds_requests.json`, so the next run resumes it.
+
+'''
+import os
+import json
+import time
+import hashlib
+import threading
+import concurrent.futures
+
+# hours of the day of the hourly ERA5 data
+HOURS = [f"{h:02d}:00" for h in range(0, 24)]
+
+# lead times (in hours) of the daily SEAS5.1 data, 1 to 215 days
+LEADTIMES = [str(24 * d) for d in range(1, 216)]
+
+# request for the hourly ERA5 'var' in 'month' of 'year' within 'lats' and
+# 'lons', for the list of 'days' or for the whole month. returns the dataset
+# and the request
+def era5_request(var, month, year, lats, lons, days=None):
+    if days is None:
+        # API ignores cases where there are less than 31 days
+        days = range(1, 32)
+    return ("reanalysis-era5-single-levels",
+            {"product_type": ["reanalysis"],
+             "data_format": "grib",
+             "download_format": "unarchived",
+             "variable": [var],
+             "area": [float(lats[1]), float(lons[0]), float(lats[0]),
+                      float(lons[1])],
+             "time": HOURS,
+             "day": [f"{d:02d}" for d in days],
+             "month": [month],
+             "year": [str(year)]})
+
+# request for the SEAS5.1 forecast of 'var' issued in 'month' of 'year' within
+# 'lats' and 'lons'. returns the dataset and the request
+def seas51_request(var, month, year, lats, lons):
+    return ("seasonal-original-single-levels",
+            {"data_format": "grib",
+             "download_format": "unarchived",
+             "originating_centre": "ecmwf",
+             "system": "51",
+             "variable": [var],
+             "area": [float(lats[1]), float(lons[0]), float(lats[0]),
+                      float(lons[1])],
+             "day": ["01"],
+             "month": [month],
+             "year": [str(year)],
+             "leadtime_hour": LEADTIMES})
+
+# datasets whose requests can be coalesced, with the GRIB key giving the date
+# that a message belongs to
+COALESCE = {"reanalysis-era5-single-levels": "validityDate"}
+
+# GRIB short names of the variables, to split batches by variable
+SHORT_NAMES = {"2m_temperature": "2t", "snowfall": "sf",
+               "total_cloud_cover": "tcc"}
+
+# merge the downloads in 'jobs' (target -> (dataset, request)) that only
+# differ in their year and variable into batches of at most 'max_years'
+# years. returns a list of (target, dataset, request, members), 'members'
+# maps the year and short name of the GRIB messages to the files they belong
+# to and is None if the batch is a single download to 'target'. variables
+# that are not in 'short_names' (by default `SHORT_NAMES`) are not batched
+def plan(jobs, max_years=12, short_names=None):
+    if short_names is None:
+        short_names = SHORT_NAMES
+    batches, groups = [], {}
+    for target, (dataset, request) in jobs.items():
+        variable = request.get("variable", [])
+        if (dataset not in COALESCE or len(request["year"]) != 1
+                or len(variable) != 1 or variable[0] not in short_names):
+            batches.append((target, dataset, request, None))
+            continue
+        rest = {k: v for k, v in request.items()
+                if k not in ("year", "variable")}
+        key = (dataset, json.dumps(rest, sort_keys=True), variable[0])
+        groups.setdefault(key, {})[request["year"][0]] = target
+    # split the years of each variable into chunks and merge the variables
+    # with the same chunks of years
+    merged = {}
+    for (dataset, rest, variable), targets in groups.items():
+        years = sorted(targets)
+        for i in range(0, len(years), max_years):
+            chunk = tuple(years[i:i + max_years])
+            merged.setdefault((dataset, rest, chunk), {})[variable] = targets
+    for (dataset, rest, chunk), variables in merged.items():
+        members = {(year, short_names[v]): targets[year]
+                   for v, targets in variables.items() for year in chunk}
+        if len(members) == 1:
+            target = list(members.values())[0]
+            batches.append((target, dataset, jobs[target][1], None))
+            continue
+        request = json.loads(rest)
+        request["variable"] = sorted(variables)
+        request["year"] = list(chunk)
+        name = hashlib.sha256(json.dumps([dataset, request], sort_keys=True)
+                              .encode()).hexdigest()[:12]
+        target = os.path.join(os.path.dirname(list(members.values())[0]),
+                              "batch_" + name + ".batch")
+        batches.append((target, dataset, request, members))
+    return batches
+
+# iterate over the messages in the GRIB file 'filename', yields the values of
+# the GRIB 'keys' and the message. only the headers are decoded, the messages
+# are returned as they are
+def grib_messages(filename, keys):
+    # eccodes is only imported when GRIB files are split
+    import eccodes
+    with open(filename, "rb") as f, open(filename, "rb") as raw:
+        while True:
+            handle = eccodes.codes_grib_new_from_file(f, headers_only=True)
+            if handle is None:
+                break
+            try:
+                values = tuple(eccodes.codes_get(handle, k) for k in keys)
+                offset = int(eccodes.codes_get(handle, "offset"))
+                length = int(eccodes.codes_get(handle, "totalLength"))
+            finally:
+                eccodes.codes_release(handle)
+            raw.seek(offset)
+            yield values, raw.read(length)
+
+# split the GRIB file 'filename' of a batch into the files in 'members',
+# selecting the messages by the year of 'date_key' and their short name.
+# returns the files for which there were no messages
+def split_grib(filename, members, date_key):
+    outputs = {}
+    try:
+        for (date, short_name), message in grib_messages(
+                filename, (date_key, "shortName")):
+            key = (str(date)[:4], short_name)
+            if key in members:
+                if key not in outputs:
+                    outputs[key] = open(members[key] + ".download", "wb")
+                outputs[key].write(message)
+    finally:
+        for out in outputs.values():
+            out.close()
+    for key in outputs:
+        os.replace(members[key] + ".download", members[key])
+    return [target for key, target in members.items() if key not in outputs]
+
+# status of a request at the CDS and the corresponding state of `Downloader`
+STATES = {"accepted": "queued", "running": "running",
+          "successful": "completed", "failed": "failed",
+          "rejected": "failed", "dismissed": "failed", "deleted": "failed"}
+
+# wrapper around the client of `cdsapi.Client` for the current CDS (an
+# `ecmwf.datastores.Client`), submitting requests without waiting for them
+class CDSClient:
+    def __init__(self, **kwargs):
+        # cdsapi is only imported when something is downloaded
+        import cdsapi
+        kwargs.setdefault("retry_max", 5)
+        legacy = cdsapi.Client(wait_until_complete=False, **kwargs)
+        self.client = getattr(legacy, "client", None)
+        if not hasattr(self.client, "get_remote"):
+            raise RuntimeError("The CDS needs cdsapi 0.7.x with the "
+                               "ecmwf-datastores client and a key of the "
+                               "current CDS")
+        self.remotes = {}
+        self.lock = threading.Lock()
+
+    # submit 'request' for 'dataset', returns the ID of the request
+    def submit(self, dataset, request):
+        remote = self.client.submit(dataset, request)
+        with self.lock:
+            self.remotes[remote.request_id] = remote
+        return remote.request_id
+
+    def _remote(self, request_id):
+        with self.lock:
+            remote = self.remotes.get(request_id)
+        if remote is None:
+            # request submitted by an earlier run
+            remote = self.client.get_remote(request_id)
+            with self.lock:
+                self.remotes[request_id] = remote
+        return remote
+
+    # state of the request: "queued", "running", "completed" or "failed".
+    # a status the CDS does not document raises a RuntimeError
+    def state(self, request_id):
+        status = self._remote(request_id).status
+        if status not in STATES:
+            raise RuntimeError("Unknown status " + repr(status)
+                               + " of CDS request " + request_id)
+        return STATES[status]
+
+    # download the result of the request to 'target'
+    def download(self, request_id, target):
+        self._remote(request_id).download(target)
+        with self.lock:
+            self.remotes.pop(request_id, None)
+
+# a request that was not complete within the timeout, it is resumed by the
+# next run
+class RequestTimeout(RuntimeError):
+    pass
+
+class Downloader:
+    def __init__(self, state_file, client=None, max_workers=4, poll=(5, 120),
+                 max_years=12, short_names=None, timeout=12 * 3600):
+        self.state_file = state_file
+        self.client = client
+        self.max_workers = max_workers
+        self.max_years = max_years
+        # GRIB short names of the variables, in addition to `SHORT_NAMES`
+        self.short_names = dict(SHORT_NAMES, **(short_names or {}))
+        # first and longest interval between two polls of a request, and
+        # the longest time to wait for a request, in s
+        self.poll = poll
+        self.timeout = timeout
+        self.jobs = {}
+        # files downloaded by `run`
+        self.completed = []
+        self.lock = threading.Lock()
+        self.split_lock = threading.Lock()
+        self.inflight = {}
+        if os.path.isfile(state_file):
+            with open(state_file, "r") as f:
+                self.inflight = json.load(f)
+
+    # add the download of 'request' for 'dataset' to 'target'. unless
+    # 'replace' is True, files that are already present are not downloaded
+    def add(self, target, dataset, request, replace=False):
+        if not replace and os.path.isfile(target):
+            print(target + " is already present, no need to download")
+            return
+        self.jobs[target] = (dataset, request)
+
+    def _save_state(self):
+        with open(self.state_file + ".tmp", "w") as f:
+            json.dump(self.inflight, f, indent=1)
+        os.replace(self.state_file + ".tmp", self.state_file)
+
+    def _record(self, target, entry):
+        with self.lock:
+            if entry is None:
+                self.inflight.pop(target, None)
+            else:
+                self.inflight[target] = entry
+            self._save_state()
+
+    # submit (or resume), wait for and download the request for 'target'
+    def _fetch(self, target, dataset, request):
+        entry = self.inflight.get(target)
+        if (entry is not None and entry["dataset"] == dataset
+                and entry["request"] == request):
+            request_id = entry["request_id"]
+            print("Resuming request " + request_id + " for " + target)
+        else:
+            print("Requesting " + os.path.basename(target))
+            request_id = self.client.submit(dataset, request)
+            self._record(target, {"request_id": request_id,
+                                  "dataset": dataset, "request": request})
+        interval = self.poll[0]
+        deadline = time.monotonic() + self.timeout
+        while True:
+            state = self.client.state(request_id)
+            if state == "completed":
+                break
+            if state == "failed":
+                raise RuntimeError("CDS request " + request_id + " for "
+                                   + target + " failed")
+            if state not in ("queued", "running"):
+                raise RuntimeError("CDS request " + request_id + " for "
+                                   + target + " is in unknown state "
+                                   + repr(state))
+            if time.monotonic() >= deadline:
+                raise RequestTimeout("CDS request " + request_id + " for "
+                                     + target + " not complete after "
+                                     + str(self.timeout) + " s, it is "
+                                     + "resumed next time")
+            time.sleep(min(interval, max(deadline - time.monotonic(), 0)))
+            interval = min(2 * interval, self.poll[1])
+        self.client.download(request_id, target + ".download")
+        os.replace(target + ".download", target)
+        self._record(target, None)
+
+    # download the batch to 'target' and split it into 'members', returns the
+    # members that could not be downloaded
+    def _fetch_batch(self, target, dataset, request, members):
+        # a batch that was downloaded but not split yet is not requested again
+        if not os.path.isfile(target):
+            self._fetch(target, dataset, request)
+        with self.split_lock:
+            missing = split_grib(target, members, COALESCE[dataset])
+        os.remove(target)
+        return missing
+
+    # download all files that were added, returns the files that could not be
+    # downloaded. the files are downloaded concurrently by at most
+    # 'max_workers' threads
+    def run(self):
+        if not self.jobs:
+            return []
+        if self.client is None:
+            try:
+                self.client = CDSClient()
+            except Exception as e:
+                print(e)
+                failed, self.jobs = list(self.jobs), {}
+                return failed
+        failed = []
+        start = time.perf_counter()
+        batches = plan(self.jobs, self.max_years, self.short_names)
+        print(str(len(self.jobs)) + " files in " + str(len(batches))
+              + " requests")
+        with concurrent.futures.ThreadPoolExecutor(self.max_workers) as pool:
+            futures = {}
+            for target, dataset, request, members in batches:
+                if members is None:
+                    future = pool.submit(self._fetch, target, dataset, request)
+                else:
+                    future = pool.submit(self._fetch_batch, target, dataset,
+                                         request, members)
+                futures[future] = (target, members)
+            for future in concurrent.futures.as_completed(futures):
+                target, members = futures[future]
+                try:
+                    missing = future.result()
+                    for m in missing or []:
+                        print("No data for " + m + " in " + target)
+                        failed.append(m)
+                    if members is None:
+                        self.completed.append(target)
+                    else:
+                        self.completed.extend(m for m in members.values()
+                                              if m not in missing)
+                    print("Downloaded " + target)
+                except Exception as e:
+                    print(e)
+                    if members is None:
+                        failed.append(target)
+                    else:
+                        failed.extend(members.values())
+                    # forget the request, it is submitted again next time,
+                    # unless it is only still waiting at the CDS
+                    if not isinstance(e, RequestTimeout):
+                        self._record(target, None)
+                    # delete the partially downloaded file (or batch)
+                    if os.path.isfile(target + ".download"):
+                        os.remove(target + ".download")
+                    if members is not None:
+                        for m in [target] + [m + ".download"
+                                             for m in members.values()]:
+                            if os.path.isfile(m):
+                                os.remove(m)
+        print(str(len(self.jobs) - len(failed)) + " of " + str(len(self.jobs))
+              + " files downloaded after "
+              + f"{time.perf_counter() - start:.0f}" + " s")
+        self.jobs = {}
+        return failed
@@ -0,0 +1,72 @@
+''' climatology
+
+Climatological seasonal cycle of the water temperature. All statistics (mean,
+standard deviation, minimum and maximum for each day of the Jul. 1 - Jun. 30
+season) are computed in one vectorized pass over the (seasons x 365) season
+matrix. The result is kept as a small `.npz` artifact next to
+`Twater_Longueuil_preprocessed.nc` and only rebuilt when that file changes, so
+the daily scripts just load a (365 x 4) array.
+
+'''
+import os
+import numpy as np
+
+from sliceop import seasons
+
+# statistics stored in the columns of the climatology
+STATS = ["mean", "std", "min", "max"]
+
+# compute the statistics in STATS along the seasons of a (seasons x days)
+# matrix, NaN are ignored, returns a (days x len(STATS)) array
+def day_stats(matrix):
+    matrix = np.asarray(matrix, dtype=float)
+    valid = ~np.isnan(matrix)
+    count = valid.sum(axis=0)
+    filled = np.where(valid, matrix, 0.)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = filled.sum(axis=0) / count
+        var = (filled ** 2).sum(axis=0) / count - mean ** 2
+    std = np.sqrt(np.maximum(var, 0.))
+    low = np.where(valid, matrix, np.inf).min(axis=0)
+    high = np.where(valid, matrix, -np.inf).max(axis=0)
+    stats = np.stack([mean, std, low, high], axis=1)
+    stats[count == 0] = np.nan
+    return stats
+
+# mean and standard deviation of 'values' for each day of the year (1-366),
+# the returned arrays are indexed with the day of year
+def dayofyear_moments(dayofyear, values):
+    values = np.asarray(values, dtype=float)
+    use = ~np.isnan(values)
+    doy = np.asarray(dayofyear)[use]
+    count = np.bincount(doy, minlength=367)
+    total = np.bincount(doy, weights=values[use], minlength=367)
+    squares = np.bincount(doy, weights=values[use] ** 2, minlength=367)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        std = np.sqrt(np.maximum(squares / count - mean ** 2, 0.))
+    return mean, std
+
+# return the (365 x len(STATS)) climatology of 'var' in the preprocessed file
+# 'filename', loading it from 'artifact' if the file did not change since
+# the artifact was written
+def load_climatology(filename, var="T_no_offset", artifact=None):
+    if artifact is None:
+        artifact = os.path.splitext(filename)[0] + "_climatology.npz"
+    stat = os.stat(filename)
+    if os.path.isfile(artifact):
+        with np.load(artifact) as npz:
+            if (int(npz["size"]) == stat.st_size
+                    and int(npz["mtime_ns"]) == stat.st_mtime_ns
+                    and str(npz["var"]) == var):
+                return npz["stats"]
+    # import xarray only when the climatology needs to be rebuilt
+    import xarray as xr
+    with xr.open_dataset(filename) as ds:
+        _, matrix = seasons.season_matrix(ds.Date.values, ds[var].values)
+    stats = day_stats(matrix)
+    with open(artifact + ".tmp", "wb") as f:
+        np.savez(f, stats=stats, size=stat.st_size,
+                 mtime_ns=stat.st_mtime_ns, var=var)
+    os.replace(artifact + ".tmp", artifact)
+    return stats
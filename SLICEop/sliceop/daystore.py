@@ -0,0 +1,90 @@
+''' daystore
+
+Per-day store of the ERA5 data of a partially available month. Instead of
+downloading the whole month into `ERA5_YYYYMM_<var>.partial.grib` every week,
+`weekly_ERA5.py` keeps the complete days (24 hourly messages) in the
+directory `ERA5_YYYYMM_<var>.partial.days`, one GRIB file per day, and only
+requests the days that are missing at the end of the month so far. The
+`.partial.grib` read by `weekly_preprocess.py` is then assembled from the
+stored days. It is only rewritten when days were added, so that an unchanged
+month is neither decoded again by the GRIB cache nor reruns the weekly
+preprocessing.
+
+'''
+import os
+import glob
+import shutil
+
+from sliceop.cds import grib_messages
+
+# hourly messages of a complete day
+HOURS_PER_DAY = 24
+
+# directory of the store belonging to the file 'partial_file'
+def store_dir_for(partial_file):
+    return partial_file[:-len(".grib")] + ".days"
+
+# days that are complete in 'store'
+def complete_days(store):
+    return sorted(int(os.path.basename(f)[:2])
+                  for f in glob.glob(os.path.join(store, "[0-3][0-9].grib")))
+
+# days of the month up to 'max_day' that still need to be downloaded, from
+# the first day that is missing in 'store'
+def missing_days(store, max_day=31):
+    present = set(complete_days(store))
+    first = 1
+    while first in present:
+        first += 1
+    return list(range(first, max_day + 1))
+
+# add the complete days in the GRIB file 'filename' to 'store', returns the
+# days that were added
+def add_days(store, filename):
+    os.makedirs(store, exist_ok=True)
+    days = {}
+    for (date,), message in grib_messages(filename, ("validityDate",)):
+        days.setdefault(int(date) % 100, []).append(message)
+    added = []
+    for day, messages in sorted(days.items()):
+        if len(messages) < HOURS_PER_DAY:
+            continue
+        name = os.path.join(store, f"{day:02d}.grib")
+        with open(name + ".tmp", "wb") as f:
+            f.write(b"".join(messages))
+        os.replace(name + ".tmp", name)
+        added.append(day)
+    return added
+
+# store the complete days of an existing 'partial_file' (e.g. downloaded
+# before the store was introduced) if there is no store yet
+def seed(partial_file):
+    store = store_dir_for(partial_file)
+    if os.path.isfile(partial_file) and not os.path.isdir(store):
+        add_days(store, partial_file)
+
+# write the stored days to 'partial_file', the file is only replaced if its
+# content changed. returns True if it was written
+def assemble(partial_file):
+    store = store_dir_for(partial_file)
+    content = []
+    for d in complete_days(store):
+        with open(os.path.join(store, f"{d:02d}.grib"), "rb") as f:
+            content.append(f.read())
+    content = b"".join(content)
+    if not content:
+        return False
+    if os.path.isfile(partial_file):
+        with open(partial_file, "rb") as f:
+            if f.read() == content:
+                return False
+    with open(partial_file + ".tmp", "wb") as f:
+        f.write(content)
+    os.replace(partial_file + ".tmp", partial_file)
+    return True
+
+# remove 'partial_file' and its store, once the whole month is available
+def remove(partial_file):
+    if os.path.isfile(partial_file):
+        os.remove(partial_file)
+    shutil.rmtree(store_dir_for(partial_file), ignore_errors=True)
@@ -0,0 +1,76 @@
+''' echart
+
+Helpers to export the data of the interactive echart in `SLICEop/echart`. The
+data are written directly as javascript files that `sliceop.html` loads as
+scripts (no html server needed). Every past season has its own payload file
+that only changes when the preprocessed record changes, the running season is
+kept in a small mutable file. Files are only written when their content
+changed and are listed in `sliceop_files.js` with a hash of their content, so
+that the browser can cache the payloads of past seasons. The series can be
+written as compact payloads (values quantized to int16 and base64 encoded)
+that `sliceop_decode.js` decodes in the browser.
+
+'''
+import os
+import json
+import base64
+import hashlib
+import numpy as np
+
+# name of a season in the echart, e.g. "1992/1993"
+def season_name(season):
+    return str(season) + "/" + str(season + 1)
+
+# payload file of a past season, relative to the echart directory
+def season_file(season):
+    return "seasons/" + str(season) + "_" + str(season + 1) + ".js"
+
+# javascript statement that assigns 'obj' to 'target'
+def js_assign(target, obj):
+    return target + "=" + json.dumps(obj) + ";\n"
+
+# short hash of 'text', used to version the payload files
+def content_hash(text):
+    return hashlib.sha256(text.encode()).hexdigest()[0:12]
+
+# write 'text' to 'filename' unless the file already has this content,
+# returns True if the file was written
+def write_if_changed(filename, text):
+    if os.path.isfile(filename):
+        with open(filename, "r") as f:
+            if f.read() == text:
+                return False
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename + ".tmp", "w") as f:
+        f.write(text)
+    os.replace(filename + ".tmp", filename)
+    return True
+
+# write the payload 'text' to 'name' in 'echart_dir' if it changed, returns
+# the versioned name to list in `sliceop_files.js`
+def write_payload(echart_dir, name, text):
+    write_if_changed(os.path.join(echart_dir, name), text)
+    return name + "?v=" + content_hash(text)
+
+# compact payloads store the values as little-endian int16 in units of
+# 10**-DIGITS (i.e. 0.01 degrees Celsius), MISSING marks NaN
+DIGITS = 2
+MISSING = -32768
+
+# quantize 'values' to int16 and return the header and base64 data that
+# `decodeSeries` in `sliceop_decode.js` turns back into an array
+def encode_series(values):
+    values = np.asarray(values, dtype=float)
+    quantized = np.clip(np.round(values * 10**DIGITS), MISSING + 1, 2**15 - 1)
+    quantized[np.isnan(values)] = MISSING
+    data = quantized.astype("<i2").tobytes()
+    return {"dtype": "int16", "digits": DIGITS, "missing": MISSING,
+            "data": base64.b64encode(data).decode("ascii")}
+
+# javascript statement that assigns the series 'values' to 'target', either as
+# a compact quantized payload or as a plain array
+def js_series(target, values, compact=True):
+    if compact:
+        return (target + "=decodeSeries(" + json.dumps(encode_series(values))
+                + ");\n")
+    return js_assign(target, [float(v) for v in values])
@@ -0,0 +1,72 @@
+''' forecast
+
+Batched freeze-up forecast. The linear regression is fitted once on the
+monthly predictors, the ensemble mean and all SEAS5.1 ensemble members are
+then forecast with a single matrix multiplication on a (members x predictors)
+array and all rows are appended to the output file in one write.
+
+'''
+import os
+import numpy as np
+
+# fit the linear regression of the freeze-up dayofyear on 'variables' in
+# 'predictors' (the dataset in `monthly_predictors.nc`), returns the
+# coefficients and the intercept
+def fit(predictors, variables):
+    from sklearn.linear_model import LinearRegression
+    X = np.column_stack([predictors[v].values for v in variables])
+    model = LinearRegression().fit(X, predictors.FUDoy.values)
+    return model.coef_, model.intercept_
+
+# arrange the data of 'input_forecast' in a (members x predictors) array, the
+# first row is the ensemble mean ("_m" variables) followed by each member, if
+# a variable is not available for each member (e.g. it comes from ERA5), the
+# ensemble mean is used for all members
+def member_matrix(input_forecast, variables):
+    if "number" in input_forecast.dims:
+        members = input_forecast.sizes["number"]
+    else:
+        members = 0
+    X = np.empty((members + 1, len(variables)),
+                 dtype=input_forecast[variables[0] + "_m"].dtype)
+    for i, v in enumerate(variables):
+        X[0, i] = input_forecast[v + "_m"].values
+        if members == 0:
+            continue
+        if v in input_forecast.variables:
+            X[1:, i] = input_forecast[v].values
+        else:
+            X[1:, i] = input_forecast[v + "_m"].values
+    return X
+
+# forecast the freeze-up dayofyear for every row of 'X'
+def predict(coef, intercept, X):
+    return X @ coef + intercept
+
+# convert the forecasted dayofyear 'doy' of the season starting in 'year' to a
+# date, values larger than 365 are in the following year. for the forecast,
+# all years are considered to have 365 days, i.e. dayofyear 360 is always
+# Dec. 26
+def doy_to_date(doy, year):
+    if doy > 365:
+        return (np.datetime64(str(year + 1) + "-01-01")
+                + np.timedelta64(int(np.around(doy - 366))))
+    if year % 4 == 0 and (year % 100 != 0 or year % 400 == 0):
+        return (np.datetime64(str(year) + "-01-01")
+                + np.timedelta64(int(np.around(doy))))
+    return (np.datetime64(str(year) + "-01-01")
+            + np.timedelta64(int(np.around(doy - 1))))
+
+# append the forecasts to 'filename' in one write. the format is
+# 'date forecast is issued', 'ensemble member', 'forecasted dayofyear' with
+# the ensemble mean as member '0' and the dayofyears rounded to the nearest
+# integer number, the header line is added if the file is not present yet
+def write_forecasts(filename, issued, doys):
+    lines = [issued + "," + str(n) + "," + str(int(np.around(doy)))
+             for n, doy in enumerate(doys)]
+    if os.path.isfile(filename):
+        text = "\n" + "\n".join(lines)
+    else:
+        text = "time,number,FUD\n" + "\n".join(lines)
+    with open(filename, "a") as f:
+        f.write(text)
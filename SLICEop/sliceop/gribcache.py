@@ -0,0 +1,216 @@
+''' gribcache
+
+Persistent cache of decoded GRIB files. The first time a downloaded
+`ERA5_*.grib` or `SEAS51_*.grib` file is opened, it is decoded with cfgrib and
+every variable and coordinate is written to its own `.npy` file. Later runs
+load these arrays memory-mapped instead of scanning and decoding the GRIB file
+again. Cache entries are keyed by the SHA-256 of the GRIB file's content, the
+file's size and modification time are kept next to it so that the hash only
+needs to be recomputed when the file was touched. When a GRIB file is
+replaced (e.g. the `.partial.grib` files that are downloaded again every
+week), the old entry is evicted and the new content is decoded.
+
+The preprocessing only uses the average over the latitude-longitude box,
+weighted by the area (cosine of the latitude) of the grid cells. This box
+mean is stored as a separate, small entry (`open_box_mean`), which the
+download scripts compute right after a file was downloaded (`ingest`), so
+the preprocessing reads kilobytes of time series instead of the full grids.
+The means over other regions within the grid (see `screening.py`) are
+stored the same way.
+
+'''
+import os
+import json
+import glob
+import shutil
+import hashlib
+import numpy as np
+import xarray as xr
+
+# compute the SHA-256 of the content of 'filename'
+def _sha256(filename, blocksize=2**20):
+    h = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(blocksize), b""):
+            h.update(block)
+    return h.hexdigest()
+
+# convert numpy scalars in GRIB attributes to something json can store
+def _jsonable(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return value
+
+# decode 'filename' with cfgrib without writing an index file, with 'chunks'
+# the data is decoded lazily into Dask arrays of these chunks
+def decode_grib(filename, chunks=None):
+    return xr.open_dataset(filename, engine="cfgrib", decode_timedelta=True,
+                           backend_kwargs={"indexpath": ""}, chunks=chunks)
+
+# chunks to process SEAS5.1 data with Dask, SLICEOP_DASK_CHUNKS is the number
+# of ensemble members per chunk. None (without Dask) if it is not set or 0
+def dask_chunks():
+    members = int(os.environ.get("SLICEOP_DASK_CHUNKS", "0"))
+    if members > 0:
+        return {"number": members}
+    return None
+
+# write every variable and coordinate of 'ds' to 'entry' as a .npy file
+def _write_entry(ds, entry):
+    tmp = entry + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    header = {"attrs": {k: _jsonable(v) for k, v in ds.attrs.items()},
+              "variables": {}}
+    for name, var in ds.variables.items():
+        np.save(os.path.join(tmp, name + ".npy"), var.values)
+        header["variables"][name] = {
+            "dims": list(var.dims),
+            "coord": name in ds.coords,
+            "attrs": {k: _jsonable(v) for k, v in var.attrs.items()},
+        }
+    with open(os.path.join(tmp, "header.json"), "w") as f:
+        json.dump(header, f)
+    shutil.rmtree(entry, ignore_errors=True)
+    os.replace(tmp, entry)
+
+# rebuild the dataset stored in 'entry'
+def _read_entry(entry, mmap=True):
+    with open(os.path.join(entry, "header.json"), "r") as f:
+        header = json.load(f)
+    data_vars, coords = {}, {}
+    for name, info in header["variables"].items():
+        values = np.load(os.path.join(entry, name + ".npy"),
+                         mmap_mode="r" if mmap else None)
+        var = xr.Variable(info["dims"], values, attrs=info["attrs"])
+        if info["coord"]:
+            coords[name] = var
+        else:
+            data_vars[name] = var
+    return xr.Dataset(data_vars, coords=coords, attrs=header["attrs"])
+
+# suffix of the cache entries holding the box mean of a GRIB file
+BOX_MEAN = ".boxmean"
+
+# remove entries whose GRIB file no longer exists or changed content
+def _prune(cache_dir, grib_dir):
+    keep = set()
+    for record in glob.glob(os.path.join(cache_dir, "*.grib.json")):
+        source = os.path.join(grib_dir, os.path.basename(record)[:-5])
+        if not os.path.isfile(source):
+            os.remove(record)
+            continue
+        with open(record, "r") as f:
+            keep.add(json.load(f)["sha256"])
+    for entry in glob.glob(os.path.join(cache_dir, "*")):
+        name = os.path.basename(entry)
+        if os.path.isdir(entry) and name.split(".")[0] not in keep:
+            shutil.rmtree(entry, ignore_errors=True)
+
+# directory of the cache belonging to the GRIB file 'filename'
+def cache_dir_for(filename):
+    return os.path.join(os.path.dirname(os.path.abspath(filename)), "cache")
+
+# SHA-256 of 'filename', taken from its record in 'cache_dir' if the size and
+# modification time of the file did not change
+def _cached_sha256(filename, cache_dir):
+    stat = os.stat(filename)
+    record_name = os.path.join(cache_dir,
+                               os.path.basename(filename) + ".json")
+    if os.path.isfile(record_name):
+        with open(record_name, "r") as f:
+            record = json.load(f)
+        if (record["size"] == stat.st_size
+                and record["mtime_ns"] == stat.st_mtime_ns):
+            return record["sha256"]
+    # otherwise hash the content, the file might only have been touched
+    sha256 = _sha256(filename)
+    with open(record_name + ".tmp", "w") as f:
+        json.dump({"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                   "sha256": sha256}, f)
+    os.replace(record_name + ".tmp", record_name)
+    # evict entries of replaced or deleted GRIB files
+    _prune(cache_dir, os.path.dirname(os.path.abspath(filename)))
+    return sha256
+
+# open 'filename' from the cache, decoding it first if it is not cached yet
+# or if the file changed since it was cached
+def open_grib(filename, cache_dir=None, mmap=True):
+    if cache_dir is None:
+        cache_dir = cache_dir_for(filename)
+    os.makedirs(cache_dir, exist_ok=True)
+    entry = os.path.join(cache_dir, _cached_sha256(filename, cache_dir))
+    if not os.path.isdir(entry):
+        ds = decode_grib(filename)
+        _write_entry(ds, entry)
+        ds.close()
+    return _read_entry(entry, mmap)
+
+# average of 'ds' over the latitude-longitude box, weighting each grid cell
+# by the cosine of its latitude (i.e. by its area)
+def box_mean(ds):
+    weights = np.cos(np.deg2rad(ds.latitude))
+    return ds.weighted(weights).mean(("latitude", "longitude"),
+                                     keep_attrs=True)
+
+# grid cells of 'ds' within 'region' (south, north, west, east)
+def select_region(ds, region):
+    south, north, west, east = region
+    lats = np.flatnonzero((ds.latitude.values >= south)
+                          & (ds.latitude.values <= north))
+    lons = np.flatnonzero((ds.longitude.values >= west)
+                          & (ds.longitude.values <= east))
+    if lats.size == 0 or lons.size == 0:
+        raise ValueError("No grid cells within " + str(region))
+    return ds.isel(latitude=lats, longitude=lons)
+
+# open the box mean (see `box_mean`) of 'filename' from the cache. it is
+# computed once per GRIB file, from the decoded grid if that is cached and
+# from the GRIB file otherwise, and only the time series is stored. with
+# 'chunks' (see `dask_chunks`) the grid is reduced chunk by chunk with Dask,
+# using all cores and holding only a few chunks in memory at a time. with
+# 'region' (south, north, west, east) the mean is taken over the part of the
+# grid within the region instead, each region has its own entry and the grid
+# is cached to compute them
+def open_box_mean(filename, cache_dir=None, chunks=None, region=None):
+    if cache_dir is None:
+        cache_dir = cache_dir_for(filename)
+    os.makedirs(cache_dir, exist_ok=True)
+    sha256 = _cached_sha256(filename, cache_dir)
+    if region is not None:
+        entry = os.path.join(cache_dir, sha256 + BOX_MEAN + "_"
+                             + "_".join(f"{float(r):g}" for r in region))
+        if not os.path.isdir(entry):
+            ds = open_grib(filename, cache_dir)
+            _write_entry(box_mean(select_region(ds, region)), entry)
+        return _read_entry(entry, mmap=False)
+    entry = os.path.join(cache_dir, sha256 + BOX_MEAN)
+    if not os.path.isdir(entry):
+        grid = os.path.join(cache_dir, sha256)
+        if os.path.isdir(grid):
+            ds = _read_entry(grid)
+            if chunks is not None:
+                ds = ds.chunk({k: c for k, c in chunks.items()
+                               if k in ds.dims})
+        else:
+            ds = decode_grib(filename, chunks)
+        _write_entry(box_mean(ds).compute(scheduler="threads"), entry)
+        ds.close()
+    return _read_entry(entry, mmap=False)
+
+# hash the GRIB 'files' that are not in their cache yet (and evict the entries
+# of replaced files), so that several processes can then open them at once
+# without evicting the entries the other processes are writing
+def register(files):
+    for filename in files:
+        cache_dir = cache_dir_for(filename)
+        os.makedirs(cache_dir, exist_ok=True)
+        _cached_sha256(filename, cache_dir)
+
+# compute and store the box means of the GRIB 'files' right after they were
+# downloaded, SEAS5.1 files are reduced with Dask if SLICEOP_DASK_CHUNKS is set
+def ingest(files):
+    for filename in files:
+        open_box_mean(filename, chunks=dask_chunks())
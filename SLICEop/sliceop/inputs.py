@@ -0,0 +1,92 @@
+''' inputs
+
+Reduction of the box means of the ERA5 and SEAS5.1 data (see `gribcache.py`)
+to the monthly predictors of the current season that serve as input to the
+forecast. `monthly_preprocess.py`, `weekly_preprocess.py` and the replay of
+past forecasts (`replay.py`) share these functions, so that a replayed
+forecast is computed exactly like the operational one. The functions do not
+modify the datasets they are given, which can therefore be kept in memory
+and reused for several forecasts.
+
+'''
+import numpy as np
+
+from sliceop import splice
+from sliceop.predictors import era5_time
+
+# convert temperature to Celsius if in Kelvin
+def _celsius(ds, short_var):
+    if ((short_var == "t2m") & (ds[short_var].units == "K")):
+        ds = ds.copy()
+        ds[short_var] = ds[short_var] - 273.15
+    return ds
+
+# bring the box mean of hourly ERA5 data to a single 'time' axis, in Celsius
+# for temperature
+def era5_hourly(era5, short_var):
+    return _celsius(era5_time(era5), short_var)
+
+# bring the box mean of daily SEAS5.1 data to a 'time' along 'step', in
+# Celsius for temperature
+def seas51_daily(seas51, short_var):
+    # handle old and new ECMWF time dimension format
+    if seas51.time.size == 1:
+        seas51 = seas51.drop_vars("time").rename({"valid_time": "time"})
+    return _celsius(seas51, short_var)
+
+# monthly mean or monthly sum of 'short_var' in 'month' of the hourly ERA5
+# data 'era5' (see `era5_hourly`)
+def era5_monthly(era5, short_var, month, method):
+    if method == "sum":
+        # accumulations are valid for the hour before the time stamp
+        era5 = era5.assign_coords(time=era5["time"] - np.timedelta64(30, "m"))
+        tmp = era5.groupby("time.month").sum("time")[short_var].sel(
+            month=int(month))
+    elif method == "mean":
+        tmp = era5.groupby("time.month").mean("time")[short_var].sel(
+            month=int(month))
+    else:
+        raise ValueError("No method (sum or mean) specified")
+    return tmp.drop_vars([d for d in tmp.coords])
+
+# daily sums or means of the complete days (24 hourly values) of the hourly
+# ERA5 data 'era5' (see `era5_hourly`) from the first day of 'mslice' on
+def era5_days(era5, method, mslice):
+    # count number of data points per day do detect full days
+    fullday = era5.time.resample(time="1D").count()
+    if method == "sum":
+        daily = era5.resample(time="1D").sum()
+    elif method == "mean":
+        daily = era5.resample(time="1D").mean()
+    else:
+        raise ValueError("No method (sum or mean) specified")
+    return daily.where(fullday==24).dropna("time").sel(time=mslice)
+
+# replace the lead times of the SEAS5.1 forecast 'seas51' (see
+# `seas51_daily`) covered by the daily ERA5 data 'days' (see `era5_days`), for
+# "sum" the SEAS5.1 accumulation is continued from the ERA5 days (see
+# `splice.py`)
+def splice_era5(seas51, days, short_var, method):
+    seas51 = seas51.transpose("number", "step")
+    offset = splice.splice_offset(seas51.time.values, days.time.values)
+    seas51 = seas51.copy()
+    seas51[short_var] = seas51[short_var].copy(
+        data=splice.splice(seas51[short_var].values, days[short_var].values,
+                           offset, method))
+    return seas51
+
+# monthly mean or monthly sum (the accumulation at the last day 'lmonth') of
+# 'short_var' in 'month' of 'year' for each member of the SEAS5.1 forecast
+# 'seas51' (see `seas51_daily`)
+def seas51_monthly(seas51, short_var, year, month, lmonth, method):
+    if method == "sum":
+        seas51 = seas51.set_coords("time")
+        seas51 = seas51.set_xindex("time")
+        tmp = seas51[short_var].sel(time=year + "-" + month + "-" + lmonth,
+                                    method="nearest")
+    elif method == "mean":
+        tmp = seas51.groupby("time.month").mean("step")[short_var].sel(
+            month=int(month))
+    else:
+        raise ValueError("No method (sum or mean) specified")
+    return tmp.drop_vars([d for d in tmp.coords])
@@ -0,0 +1,76 @@
+''' model
+
+Registry of the fitted forecast model. The training set
+`monthly_predictors.nc` only changes once a year when `yearly_preprocess.py`
+runs, which then fits the linear regression and stores its coefficients and
+intercept in a small json artifact together with the SHA-256 of the training
+set. The weekly and monthly forecasts load this artifact instead of fitting
+the model (and importing scikit-learn). If the artifact is missing, was made
+for other predictors or for another version of the training set, the model is
+fitted again and the artifact replaced.
+
+'''
+import os
+import json
+import hashlib
+import numpy as np
+
+# version of the artifact format, artifacts of another version are refitted
+FORMAT = 1
+
+# default location of the model artifact belonging to the training set
+def model_file_for(predictors_file):
+    return os.path.join(os.path.dirname(predictors_file), "forecast_model.json")
+
+# SHA-256 of the content of the training set 'predictors_file'
+def training_hash(predictors_file):
+    with open(predictors_file, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+# store the fitted model in 'filename'
+def save_model(filename, variables, coef, intercept, sha256):
+    coef = np.asarray(coef)
+    artifact = {"format": FORMAT, "variables": list(variables),
+                "coef": [float(c) for c in coef], "intercept": float(intercept),
+                "dtype": str(coef.dtype), "training_sha256": sha256}
+    with open(filename + ".tmp", "w") as f:
+        json.dump(artifact, f, indent=1)
+    os.replace(filename + ".tmp", filename)
+
+# load the model from 'filename', returns None if there is no artifact or if
+# it does not belong to 'variables' and the training set with hash 'sha256'
+def load_model(filename, variables, sha256):
+    if not os.path.isfile(filename):
+        return None
+    with open(filename, "r") as f:
+        artifact = json.load(f)
+    if (artifact.get("format") != FORMAT
+            or artifact["variables"] != list(variables)
+            or artifact["training_sha256"] != sha256):
+        return None
+    dtype = np.dtype(artifact["dtype"])
+    return (np.array(artifact["coef"], dtype=dtype),
+            dtype.type(artifact["intercept"]))
+
+# fit the model on the training set 'predictors_file' and store it
+def fit_model(predictors_file, variables, filename=None):
+    if filename is None:
+        filename = model_file_for(predictors_file)
+    # import xarray and the model fitting only when the model is refitted
+    import xarray as xr
+    from sliceop import forecast
+    sha256 = training_hash(predictors_file)
+    with xr.open_dataset(predictors_file) as predictors:
+        coef, intercept = forecast.fit(predictors, variables)
+    save_model(filename, variables, coef, intercept, sha256)
+    return coef, intercept
+
+# return the coefficients and intercept of the model, loaded from the artifact
+# if it is up to date and fitted (and stored) otherwise
+def get_model(predictors_file, variables, filename=None):
+    if filename is None:
+        filename = model_file_for(predictors_file)
+    stored = load_model(filename, variables, training_hash(predictors_file))
+    if stored is None:
+        return fit_model(predictors_file, variables, filename)
+    return stored
@@ -0,0 +1,211 @@
+''' pipeline
+
+Runner for the stages of a SLICEop schedule (download -> preprocess ->
+forecast -> plot). Stages are the scripts in `downloads`, `prepro` and `auto`,
+run in-process with `runpy`, and form a small DAG: a stage only runs if all
+the stages it depends on succeeded, so the flag files (`updatew`, `preprow`,
+...) are no longer needed to pass the status from one stage to the next.
+
+Data can be handed from one stage to the next in memory: a stage `provides`
+some of the objects its script creates (e.g. the `monthly_vars` dataset of
+`weekly_preprocess.py`) and the dependent stages find them in the `handoff`
+dictionary of their script. Whether the outputs are also written to disk is
+decided by `materialize`, the other outputs (forecasts, plots) are always
+written.
+
+Stages that are not `volatile` (everything except the downloads) are
+fingerprinted: the SHA-256 of their script and input files, their `key`
+(e.g. the date of the run) and the fingerprints of the stages they depend on.
+A stage whose fingerprint did not change since its last successful run and
+whose outputs exist is skipped. Fingerprints and the hashes of the files are
+kept in `auto/pipeline_state.json`, shared by all schedules, with the stages
+keyed by the name of the schedule and the stage (e.g. "weekly/preprocess"),
+and a file's hash is only recomputed when its size or modification time
+changed.
+
+'''
+import os
+import sys
+import glob
+import json
+import time
+import runpy
+import hashlib
+import traceback
+
+# SHA-256 of the content of 'filename'
+def _sha256(filename, blocksize=2**20):
+    h = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(blocksize), b""):
+            h.update(block)
+    return h.hexdigest()
+
+# run the script 'script' in this process with 'handoff' in its globals, a
+# script that exits with a message or raises an exception fails. returns
+# whether it succeeded and the globals of the script
+def run_script(script, handoff=None):
+    start = time.perf_counter()
+    ok = True
+    result = {}
+    try:
+        result = runpy.run_path(script, init_globals={"handoff": handoff or {}},
+                                run_name="__main__")
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            print(e.code, file=sys.stderr)
+            ok = False
+    except Exception:
+        traceback.print_exc()
+        ok = False
+    print("[" + os.path.basename(script) + " " + ("done" if ok else "failed")
+          + " after " + f"{time.perf_counter() - start:.2f}" + " s]")
+    return ok, result
+
+# a stage of the pipeline:
+# - 'script' is run relative to SLICEOP_PATH
+# - 'after' are the names of the stages it depends on
+# - 'inputs' and 'outputs' are glob patterns relative to SLICEOP_PATH
+# - 'key' is a callable returning anything else (e.g. the date) the outputs
+#   depend on
+# - 'when' is a callable, the stage is skipped if it returns a message
+# - 'provides' maps handoff names to objects created by the script
+# - 'volatile' stages (downloads) always run
+class Stage:
+    def __init__(self, name, script, after=(), inputs=(), outputs=(),
+                 key=None, when=None, provides=None, volatile=False):
+        self.name = name
+        self.script = script
+        self.after = list(after)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.key = key
+        self.when = when
+        self.provides = provides or {}
+        self.volatile = volatile
+
+class Pipeline:
+    def __init__(self, root, stages, materialize=True, state_file=None,
+                 name=None):
+        self.root = root
+        # name of the schedule, the state of its stages is kept under it
+        self.name = name
+        self.stages = {s.name: s for s in stages}
+        self.materialize = materialize
+        if state_file is None:
+            state_file = os.path.join(root, "auto", "pipeline_state.json")
+        self.state_file = state_file
+        self.state = {"files": {}, "stages": {}}
+        if os.path.isfile(state_file):
+            with open(state_file, "r") as f:
+                self.state = json.load(f)
+
+    # stages in an order in which each stage comes after its dependencies
+    def order(self):
+        done, order = set(), []
+        def visit(name, path=()):
+            if name in done:
+                return
+            if name in path:
+                raise ValueError("Cycle in pipeline at stage " + name)
+            for dep in self.stages[name].after:
+                visit(dep, path + (name,))
+            done.add(name)
+            order.append(self.stages[name])
+        for name in self.stages:
+            visit(name)
+        return order
+
+    # files matching the glob 'patterns' relative to the root
+    def _files(self, patterns):
+        files = set()
+        for p in patterns:
+            files.update(glob.glob(os.path.join(self.root, p)))
+        return sorted(files)
+
+    # hash of 'filename', reusing the stored hash if the file did not change
+    def _file_hash(self, filename):
+        stat = os.stat(filename)
+        rel = os.path.relpath(filename, self.root)
+        record = self.state["files"].get(rel)
+        if (record is None or record["size"] != stat.st_size
+                or record["mtime_ns"] != stat.st_mtime_ns):
+            record = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                      "sha256": _sha256(filename)}
+            self.state["files"][rel] = record
+        return record["sha256"]
+
+    # key of 'stage' in the state of the stages
+    def _state_key(self, stage):
+        if self.name is None:
+            return stage.name
+        return self.name + "/" + stage.name
+
+    # fingerprint of 'stage' from its script, inputs, key and dependencies
+    def fingerprint(self, stage, fingerprints):
+        h = hashlib.sha256()
+        script = os.path.join(self.root, stage.script)
+        h.update(stage.script.encode())
+        if os.path.isfile(script):
+            h.update(self._file_hash(script).encode())
+        h.update(json.dumps(stage.key() if stage.key else None,
+                            default=str).encode())
+        for f in self._files(stage.inputs):
+            h.update(os.path.relpath(f, self.root).encode())
+            h.update(self._file_hash(f).encode())
+        for dep in stage.after:
+            h.update(str(fingerprints.get(dep)).encode())
+        return h.hexdigest()
+
+    def _save_state(self):
+        with open(self.state_file + ".tmp", "w") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(self.state_file + ".tmp", self.state_file)
+
+    # run all stages, returns the status of each stage ("done", "skipped",
+    # "unchanged" or "failed")
+    def run(self):
+        status, fingerprints, handoff = {}, {}, {}
+        for stage in self.order():
+            failed = [d for d in stage.after
+                      if status.get(d) not in ("done", "unchanged")]
+            if failed:
+                print("\n[" + stage.name + " skipped because " + ", ".join(failed)
+                      + " did not succeed]")
+                status[stage.name] = "skipped"
+                continue
+            reason = stage.when() if stage.when else None
+            if reason:
+                print("\n[" + stage.name + " skipped: " + reason + "]")
+                status[stage.name] = "skipped"
+                continue
+            if not stage.volatile:
+                fingerprints[stage.name] = self.fingerprint(stage,
+                                                            fingerprints)
+                outputs_exist = all(self._files([p]) for p in stage.outputs)
+                if (self.state["stages"].get(self._state_key(stage))
+                        == fingerprints[stage.name] and outputs_exist):
+                    print("\n[" + stage.name + " unchanged since last run]")
+                    status[stage.name] = "unchanged"
+                    continue
+            print("\n[" + stage.name + "]")
+            inputs = dict(handoff)
+            inputs["materialize"] = self.materialize
+            ok, result = run_script(os.path.join(self.root, stage.script),
+                                    inputs)
+            status[stage.name] = "done" if ok else "failed"
+            if not ok:
+                self.state["stages"].pop(self._state_key(stage), None)
+                continue
+            for name, var in stage.provides.items():
+                if var in result:
+                    handoff[name] = result[var]
+            # a stage that only handed its results over in memory cannot be
+            # skipped later, its outputs on disk are out of date
+            if not stage.volatile and (self.materialize or not stage.provides):
+                self.state["stages"][self._state_key(stage)] = (
+                    fingerprints[stage.name])
+            else:
+                self.state["stages"].pop(self._state_key(stage), None)
+        self._save_state()
+        return status
@@ -0,0 +1,105 @@
+''' predictors
+
+Reduction of the hourly ERA5 data of one month to a monthly predictor (the
+monthly mean or the monthly sum of the area-weighted box average), and a
+small table that keeps these reductions between runs. Each year's value is
+computed once from its `ERA5_YYYYMM_<variable>.grib` file and reused as long
+as the file does not change, so that `yearly_preprocess.py` only needs to
+decode the newly downloaded year.
+
+'''
+import os
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from sliceop.gribcache import open_box_mean
+
+# columns of the reduction table
+TABLE_COLUMNS = ["variable", "year", "value", "file", "size", "mtime_ns",
+                 "reduction", "method"]
+
+# how the box average is computed, values reduced differently are recomputed
+REDUCTION = "coslat"
+
+# bring ERA5 data to a single 'time' axis, handling the old (time and step)
+# and new ECMWF ERA5 time dimension format
+def era5_time(era5):
+    if era5.step.size > 1:
+        era5 = era5.rename({"time": "old_time"}).stack(time=("old_time",
+            "step")).reset_index(["old_time", "step"]).drop_vars(["old_time",
+                "step"])
+        era5["time"] = era5["valid_time"]
+        era5 = era5.drop_vars(["valid_time"])
+    else:
+        era5 = era5.drop_vars(["step"])
+        era5["time"] = era5["valid_time"]
+        era5 = era5.drop_vars(["valid_time"])
+    return era5
+
+# reduce the ERA5 data of one month to the monthly mean or monthly sum of the
+# box average of 'short_var'
+def reduce_month(era5, short_var, month, method):
+    era5 = era5_time(era5)
+    # convert temperature to Celsius if in Kelvin
+    if ((short_var == "t2m") & (era5[short_var].units == "K")):
+        era5[short_var] = era5[short_var] - 273.15
+    box = era5[short_var]
+    # accumulations are valid for the hour before the time stamp, shifting by
+    # 30 minutes moves the first time step into the previous month
+    if method == "sum":
+        box["time"] = box["time"] - np.timedelta64(30, "m")
+        return box.where(box.time.dt.month == int(month), drop=True).sum(
+            "time").values
+    elif method == "mean":
+        return box.where(box.time.dt.month == int(month), drop=True).mean(
+            "time").values
+    else:
+        raise ValueError("No method (sum or mean) specified")
+
+# load the reduction table from 'filename' as a dictionary with
+# (variable, year) as keys
+def load_table(filename):
+    if not os.path.isfile(filename):
+        return {}
+    df = pd.read_csv(filename)
+    return {(r["variable"], int(r["year"])): r
+            for r in df.to_dict(orient="records")}
+
+# save the reduction table to 'filename'
+def save_table(table, filename):
+    df = pd.DataFrame(list(table.values()), columns=TABLE_COLUMNS)
+    df.sort_values(["variable", "year"]).to_csv(filename + ".tmp",
+                                                 index=False)
+    os.replace(filename + ".tmp", filename)
+
+# return the monthly predictor of 'variable' (the name of the predictor in
+# `predictors.json`) in 'year' from 'gribfile', the file is only decoded if it
+# is not in 'table' or changed (or the method changed) since it was reduced
+def reduce_file(table, variable, year, gribfile, short_var, month, method):
+    stat = os.stat(gribfile)
+    record = table.get((variable, year))
+    if (record is not None
+            and os.path.basename(gribfile) == record["file"]
+            and record["size"] == stat.st_size
+            and record["mtime_ns"] == stat.st_mtime_ns
+            and record.get("reduction") == REDUCTION
+            and record.get("method") == method):
+        return record["value"]
+    value = float(reduce_month(open_box_mean(gribfile), short_var, month,
+                               method))
+    table[(variable, year)] = {"variable": variable, "year": year,
+                               "value": value,
+                               "file": os.path.basename(gribfile),
+                               "size": stat.st_size,
+                               "mtime_ns": stat.st_mtime_ns,
+                               "reduction": REDUCTION,
+                               "method": method}
+    return value
+
+# time series of the monthly predictor of 'variable' for 'years'
+def predictor_series(table, variable, years):
+    values = np.array([table[(variable, y)]["value"] for y in years],
+                      dtype=np.float32)
+    return xr.DataArray(values, coords={"time": np.array(years)},
+                        dims="time", name=variable)
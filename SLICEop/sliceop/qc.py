@@ -0,0 +1,26 @@
+''' qc
+
+Quality control helpers for the water temperature time series that work on
+plain NumPy arrays and therefore at any resolution (daily or 1-minute data).
+
+'''
+import numpy as np
+
+# find the runs of consecutive True values in the boolean 'mask', returns the
+# index of the first element of each run and the index after its last element
+def runs(mask):
+    padded = np.concatenate([[False], np.asarray(mask, dtype=bool), [False]])
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    return edges[0::2], edges[1::2]
+
+# return a boolean array that is True for all elements of 'mask' that belong
+# to a run of at least 'min_length' consecutive True values
+def long_runs(mask, min_length):
+    starts, stops = runs(mask)
+    keep = (stops - starts) >= min_length
+    # +1 at the start and -1 after the end of each long run, the cumulative
+    # sum is then 1 inside the runs and 0 elsewhere
+    delta = np.zeros(len(mask) + 1, dtype=np.int64)
+    delta[starts[keep]] += 1
+    delta[stops[keep]] -= 1
+    return np.cumsum(delta[:-1]) > 0
@@ -0,0 +1,107 @@
+''' registry
+
+Registry of the predictors of the forecast, read from `predictors.json` in
+SLICEOP_PATH by every stage: the downloads, the preprocessing, the forecasts,
+the replay of past forecasts and the screening of new predictors. Adding or
+changing a predictor is therefore a change of `predictors.json` only.
+
+Each predictor is the monthly mean or sum ('method') of an ERA5/SEAS5.1
+'variable' in one 'month' of the season (July to December) over the 'area'
+of the downloads. 'short_name' is the name of the variable in the decoded
+data and 'grib_name' its GRIB short name. The data of a predictor is stored
+under its 'name', which is the variable unless the same variable is used in
+several months.
+
+'''
+import os
+import json
+import calendar
+import numpy as np
+
+# months of the season the predictors can be taken from, the data of these
+# months belongs to the year in which the season starts
+MONTHS = ["07", "08", "09", "10", "11", "12"]
+
+# position of 'month' in the season, from July (0) to June (11)
+def season_index(month):
+    return (int(month) - 7) % 12
+
+# True if 'month' of the season is complete, i.e. available from ERA5, by the
+# monthly download on the 7th of 'current'
+def complete(month, current):
+    return season_index(month) < season_index(current)
+
+class Predictor:
+    def __init__(self, variable, short_name, grib_name, month, method,
+                 name=None):
+        if month not in MONTHS:
+            raise ValueError("Month of " + variable + " needs to be one of "
+                             + ", ".join(MONTHS))
+        if method not in ("mean", "sum"):
+            raise ValueError("No method (sum or mean) specified for "
+                             + variable)
+        self.variable = variable
+        self.short_name = short_name
+        self.grib_name = grib_name
+        self.month = month
+        self.method = method
+        self.name = name or variable
+        # last day of the month, the accumulation of "sum" is taken there
+        self.last_day = f"{calendar.monthrange(2001, int(month))[1]:02d}"
+
+class Registry:
+    def __init__(self, predictors, lats, lons):
+        self.predictors = list(predictors)
+        names = [p.name for p in self.predictors]
+        if len(set(names)) != len(names):
+            raise ValueError("Predictor names need to be unique, give a "
+                             + "'name' to variables used more than once")
+        self.lats = np.array(lats)
+        self.lons = np.array(lons)
+
+    def __iter__(self):
+        return iter(self.predictors)
+
+    def __len__(self):
+        return len(self.predictors)
+
+    # the attributes of all predictors as lists, in the order of the registry
+    @property
+    def names(self):
+        return [p.name for p in self.predictors]
+
+    @property
+    def variables(self):
+        return [p.variable for p in self.predictors]
+
+    @property
+    def short_vars(self):
+        return [p.short_name for p in self.predictors]
+
+    @property
+    def months(self):
+        return [p.month for p in self.predictors]
+
+    @property
+    def last_days(self):
+        return [p.last_day for p in self.predictors]
+
+    @property
+    def methods(self):
+        return [p.method for p in self.predictors]
+
+    # GRIB short names of the variables (see `cds.plan`)
+    @property
+    def grib_names(self):
+        return {p.variable: p.grib_name for p in self.predictors}
+
+# the registry in 'filename', by default `predictors.json` in 'path'
+def load(path=None, filename=None):
+    if filename is None:
+        if path is None:
+            path = os.environ["SLICEOP_PATH"]
+        filename = os.path.join(path, "predictors.json")
+    with open(filename, "r") as f:
+        config = json.load(f)
+    return Registry([Predictor(**p) for p in config["predictors"]],
+                    config["area"]["lats"], config["area"]["lons"])
@@ -0,0 +1,335 @@
+''' replay
+
+Replay of the weekly and monthly forecasts SLICEop would have issued in past
+seasons, in a single process. `run_test.sh` used to loop over every day in
+bash, faking the date with TEST, YEAR, MONTH and DAY and running the whole
+weekly and monthly schedules (downloads, preprocessing and forecast) for
+every Monday and every 7th. Here the date of a forecast is a plain argument
+(a virtual clock) and the data it would have used is derived from the date,
+with the rules of the download scripts in TEST mode:
+
+- a month of ERA5 is used from the 7th of the following month on, when the
+  monthly download fetches it, so the ERA5 data no longer needs to be moved
+  aside during the replay.
+- a SEAS5.1 forecast is used from the 7th of the month it was issued.
+- the weekly forecasts update the SEAS5.1 data with the current month of
+  ERA5 up to 5 days before the date (see `partial_days`). These partial
+  months are cut from the complete months in `downloads/ERA5` instead of
+  being downloaded.
+
+Each GRIB file's box mean is loaded once and each monthly predictor reduced
+once, and then reused by all forecasts of the season that use them. The
+predictors are reduced with the functions in `inputs.py` that the
+preprocessing scripts use, and forecast with the current model (see
+`model.py`). Seasons are independent of each other and can be replayed in
+parallel by a pool of processes, each of which replays whole seasons. All
+forecasts are written to one table (`auto/replay.csv` by default) with the
+columns 'kind' (weekly or monthly), 'season', 'time' (the date the forecast
+is issued), 'number' (the ensemble member, 0 is the ensemble mean) and 'FUD'.
+A `hindcast` uses one process per core and also writes the forecasts to the
+`YYYYFUDweekly` and `YYYYFUDmonthly` files of each season, like the
+operational forecasts.
+
+'''
+import os
+import time
+import datetime
+import concurrent.futures
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from sliceop import cds, forecast, gribcache, inputs, model, registry
+from sliceop.gribcache import open_box_mean
+
+# columns of the results table
+COLUMNS = ["kind", "season", "time", "number", "FUD"]
+
+# forecast season (the year of the July in which it starts) of 'date'
+def season_of(date):
+    return date.year if date.month >= 7 else date.year - 1
+
+# forecasts issued from 'start' to 'end' (both included) as (kind, date): the
+# monthly forecast on the 7th and the weekly forecast on Mondays, except in
+# May and June and before the first monthly forecast of the season
+def issue_dates(start, end):
+    dates = []
+    day = start
+    while day <= end:
+        if day.month not in (5, 6):
+            if day.day == 7:
+                dates.append(("monthly", day))
+            if day.weekday() == 0 and not (day.month == 7 and day.day < 7):
+                dates.append(("weekly", day))
+        day += datetime.timedelta(days=1)
+    return dates
+
+# first day on which the complete 'month' of 'year' of ERA5 is used, it is
+# downloaded on the 7th of the following month
+def era5_available(year, month):
+    if month == 12:
+        return datetime.date(year + 1, 1, 7)
+    return datetime.date(year, month + 1, 7)
+
+# last day of the current month of ERA5 of each of the 'predictors' (by name)
+# that the weekly download on 'date' adds to the partial month (see
+# `weekly_ERA5.py`): the days up to 5 days before 'date', and the previous
+# month until it is downloaded completely on the 7th
+def partial_days(date, predictors):
+    max_day = date.day - 5
+    month = f"{date.month:02d}"
+    previous_month = f"{(date.month - 2) % 12 + 1:02d}"
+    days = {}
+    for p in predictors:
+        if p.month == previous_month and date.day < 7:
+            days[p.name] = int(p.last_day) + min(max_day, 0)
+        elif p.month == month and max_day > 0:
+            days[p.name] = max_day
+    return days
+
+class Replay:
+    def __init__(self, path, coef, intercept):
+        self.path = path
+        self.coef = coef
+        self.intercept = intercept
+        # the predictors, as in the preprocessing scripts
+        self.predictors = registry.load(path)
+        # box means and reduced predictors (by name and source) of the current
+        # season
+        self.boxes = {}
+        self.reduced = {}
+
+    # GRIB file of 'source' (ERA5 or SEAS51) for 'variable' in 'month' of
+    # 'year'
+    def _grib(self, source, year, month, variable):
+        return (self.path + "/downloads/" + source + "/" + source + "_"
+                + str(year) + f"{month:02d}" + "_" + variable + ".grib")
+
+    # data of predictor 'p' used by the forecast 'kind' on 'date', as in the
+    # preprocessing scripts: ("ERA5", file, None) for a complete month of
+    # ERA5, ("SEAS51", file, partial) for SEAS5.1, with 'partial' the ERA5
+    # file and the last day the SEAS5.1 data is updated with, or None if the
+    # data is missing
+    def source(self, kind, date, p):
+        season = season_of(date)
+        month = int(p.month)
+        era5name = self._grib("ERA5", season, month, p.variable)
+        if date >= era5_available(season, month) and os.path.isfile(era5name):
+            return ("ERA5", era5name, None)
+        if month < date.month:
+            issued = month
+        elif kind == "weekly" and date.day < 7:
+            issued = 12 if date.month == 1 else date.month - 1
+        else:
+            issued = date.month
+        seas51name = self._grib("SEAS51", season, issued, p.variable)
+        year = season if issued >= 7 else season + 1
+        if (date < datetime.date(year, issued, 7)
+                or not os.path.isfile(seas51name)):
+            return None
+        partial = None
+        days = partial_days(date, [p]) if kind == "weekly" else {}
+        if p.name in days and os.path.isfile(era5name):
+            partial = (era5name, days[p.name])
+        return ("SEAS51", seas51name, partial)
+
+    # GRIB files used by the forecasts 'dates'
+    def files(self, dates):
+        files = set()
+        for kind, date in dates:
+            for p in self.predictors:
+                source = self.source(kind, date, p)
+                if source is not None:
+                    files.add(source[1])
+                    if source[2] is not None:
+                        files.add(source[2][0])
+        return sorted(files)
+
+    # box mean of 'filename' of predictor 'p' (see `inputs.py`)
+    def _box(self, filename, p, source):
+        if filename not in self.boxes:
+            box = open_box_mean(filename)
+            if source == "ERA5":
+                box = inputs.era5_hourly(box, p.short_name)
+            else:
+                box = inputs.seas51_daily(box, p.short_name)
+            self.boxes[filename] = box
+        return self.boxes[filename]
+
+    # monthly predictor 'p' (the SEAS5.1 members or a single value) of
+    # 'source' (see `source`) in 'season'
+    def predictor(self, source, p, season):
+        # a variable used in several months reads the same SEAS5.1 files for
+        # each of its predictors, the reductions are kept per predictor
+        key = (p.name, source)
+        if key not in self.reduced:
+            kind, filename, partial = source
+            if kind == "ERA5":
+                value = inputs.era5_monthly(self._box(filename, p, kind),
+                                            p.short_name, p.month, p.method)
+            else:
+                seas51 = self._box(filename, p, kind)
+                if partial is not None:
+                    # the complete days of the month up to the last day
+                    # the weekly download would have fetched
+                    start = str(season) + "-" + p.month + "-01"
+                    days = inputs.era5_days(
+                        self._box(partial[0], p, "ERA5"), p.method,
+                        slice(start, start[:-2] + f"{partial[1]:02d}"))
+                    seas51 = inputs.splice_era5(seas51, days, p.short_name,
+                                                p.method)
+                value = inputs.seas51_monthly(seas51, p.short_name,
+                                              str(season), p.month,
+                                              p.last_day, p.method)
+            self.reduced[key] = value
+        return self.reduced[key]
+
+    # input of the forecast 'kind' on 'date' as the preprocessing scripts
+    # would have written it, None if data is missing
+    def input_forecast(self, kind, date):
+        monthly_vars = xr.Dataset()
+        for p in self.predictors:
+            source = self.source(kind, date, p)
+            if source is None:
+                print(date.isoformat() + " " + kind + ": " + p.variable
+                      + " not found")
+                return None
+            value = self.predictor(source, p, season_of(date))
+            if source[0] == "ERA5":
+                if kind == "weekly":
+                    monthly_vars[p.name] = value
+                monthly_vars[p.name + "_m"] = value
+            else:
+                monthly_vars[p.name] = value
+                monthly_vars[p.name + "_m"] = value.mean("number")
+        return monthly_vars
+
+    # forecasted dayofyears (the ensemble mean followed by the members) of
+    # the forecast 'kind' on 'date', None if data is missing
+    def forecast(self, kind, date):
+        input_forecast = self.input_forecast(kind, date)
+        if input_forecast is None:
+            return None
+        return forecast.predict(self.coef, self.intercept,
+                                forecast.member_matrix(
+                                    input_forecast, self.predictors.names))
+
+    # replay the forecasts 'dates' (see `issue_dates`) of one season, returns
+    # the rows of the results table
+    def season(self, dates):
+        rows = []
+        for kind, date in dates:
+            doys = self.forecast(kind, date)
+            if doys is None:
+                continue
+            rows.extend((kind, season_of(date), date.isoformat(), n,
+                         int(np.around(doy))) for n, doy in enumerate(doys))
+        # the data of a season is not used by the other seasons
+        self.boxes.clear()
+        self.reduced.clear()
+        return rows
+
+# download the ERA5 and SEAS5.1 data of the forecasts issued until 'end' in
+# 'seasons' that is not in 'path' yet, returns the files that could not be
+# downloaded
+def download(path, seasons, end):
+    predictors = registry.load(path)
+    lats, lons = predictors.lats, predictors.lons
+    downloader = cds.Downloader(path + "/downloads/cds_requests.json",
+                                short_names=predictors.grib_names)
+    for season in seasons:
+        for p in predictors:
+            if end >= era5_available(season, int(p.month)):
+                downloader.add(path + "/downloads/ERA5/ERA5_" + str(season)
+                               + p.month + "_" + p.variable + ".grib",
+                               *cds.era5_request(p.variable, p.month, season,
+                                                 lats, lons))
+            # SEAS5.1 is downloaded in the months of the season until the
+            # month of the predictor is complete (see `monthly_SEAS51_ERA5.py`)
+            for month in registry.MONTHS:
+                if (registry.complete(p.month, month)
+                        or end < datetime.date(season, int(month), 7)):
+                    continue
+                downloader.add(path + "/downloads/SEAS51/SEAS51_" + str(season)
+                               + month + "_" + p.variable + ".grib",
+                               *cds.seas51_request(p.variable, month, season,
+                                                   lats, lons))
+    failed = downloader.run()
+    # reduce the new files to their box means right away
+    gribcache.ingest(downloader.completed)
+    return failed
+
+# the replay of a worker process, set up once per process by `_init_worker`
+_worker = None
+
+def _init_worker(path, coef, intercept):
+    global _worker
+    _worker = Replay(path, coef, intercept)
+
+# replay the forecasts 'dates' of one season, in a worker process
+def _replay_season(dates):
+    return _worker.season(dates)
+
+# replay all forecasts issued from 'start' to 'end' (dates, both included)
+# with the data in 'path', the seasons are replayed by 'workers' processes.
+# with 'fetch' the missing data is downloaded first. returns the results table
+# and writes it to 'output'
+def run(path, start, end, workers=1, output=None, fetch=False):
+    if output is None:
+        output = path + "/auto/replay.csv"
+    begin = time.perf_counter()
+    seasons = {}
+    for kind, date in issue_dates(start, end):
+        seasons.setdefault(season_of(date), []).append((kind, date))
+    if fetch:
+        download(path, seasons, end)
+    coef, intercept = model.get_model(path + "/prepro/monthly_predictors.nc",
+                                      registry.load(path).names)
+    replay = Replay(path, coef, intercept)
+    rows = []
+    if workers > 1 and len(seasons) > 1:
+        # hash the GRIB files up front, the workers only add cache entries
+        gribcache.register(replay.files(
+            [d for dates in seasons.values() for d in dates]))
+        # each worker replays whole seasons, the results come back in order
+        with concurrent.futures.ProcessPoolExecutor(
+                min(workers, len(seasons)), initializer=_init_worker,
+                initargs=(path, coef, intercept)) as pool:
+            for result in pool.map(_replay_season, seasons.values()):
+                rows.extend(result)
+    else:
+        for dates in seasons.values():
+            rows.extend(replay.season(dates))
+    table = pd.DataFrame(rows, columns=COLUMNS)
+    table.to_csv(output + ".tmp", index=False)
+    os.replace(output + ".tmp", output)
+    print(str(len(table[table.number == 0])) + " forecasts of "
+          + str(len(seasons)) + " seasons replayed after "
+          + f"{time.perf_counter() - begin:.1f}" + " s, written to " + output)
+    return table
+
+# write the forecasts in 'table' to one file per season and kind in
+# 'directory', in the format of the `YYYYFUDweekly` and `YYYYFUDmonthly` files
+# of the operational forecasts (see `forecast.write_forecasts`). existing files
+# of the seasons are replaced
+def write_seasons(table, directory):
+    for (season, kind), rows in table.groupby(["season", "kind"]):
+        filename = os.path.join(directory, str(season) + "FUD" + kind)
+        lines = (rows.time + "," + rows.number.astype(str) + ","
+                 + rows.FUD.astype(str))
+        with open(filename + ".tmp", "w") as f:
+            f.write("time,number,FUD\n" + "\n".join(lines))
+        os.replace(filename + ".tmp", filename)
+
+# hindcast: replay the forecasts issued from 'start' to 'end' with one
+# process per core (or 'workers' processes) and write them to the per-season
+# files in 'directory' (by default `auto`) as well as to the results table
+def hindcast(path, start, end, workers=None, directory=None, fetch=False):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if directory is None:
+        directory = path + "/auto"
+    table = run(path, start, end, workers=workers,
+                output=os.path.join(directory, "replay.csv"), fetch=fetch)
+    write_seasons(table, directory)
+    return table
@@ -0,0 +1,143 @@
+''' schedules
+
+The daily, weekly, monthly and yearly schedules of SLICEop as pipelines of
+stages (see `pipeline.py`), run in a single Python process instead of one
+interpreter per step. Modules like xarray are therefore imported (at most)
+once per schedule and only by the stages that actually need them. The
+`run_*.sh` drivers call `python -m sliceop run <schedule>`.
+
+Within a schedule the stages pass their status (and the preprocessed input of
+the forecast) in memory. Only the state shared between schedules is still kept
+in flag files: `preproy` (yearly preprocessing succeeded), `updatey` (ERA5
+data for the yearly preprocessing downloaded) and `frozen`.
+
+'''
+import os
+import time
+import datetime
+import platform
+
+from sliceop.pipeline import Pipeline, Stage
+
+# absolute path of 'name' in SLICEOP_PATH
+def _path(name):
+    return os.path.join(os.environ["SLICEOP_PATH"], name)
+
+# True if the flag file 'name' contains "True"
+def read_flag(name):
+    with open(_path(name), "r") as f:
+        return f.read().strip() == "True"
+
+# write "True" or "False" to the flag file 'name'
+def write_flag(name, value):
+    with open(_path(name), "w") as f:
+        f.write(str(bool(value)) + "\n")
+
+# date of the run, taken from YEAR, MONTH and DAY when testing
+def run_date():
+    if os.environ.get("TEST") == "True":
+        return (os.environ["YEAR"] + "-" + os.environ["MONTH"] + "-"
+                + os.environ.get("DAY", "01"))
+    return datetime.date.today().isoformat()
+
+# conditions of the stages, they return the reason to skip the stage or None
+def _yearly_done():
+    if not read_flag("prepro/preproy"):
+        return "Yearly update of monthly predictors failed, cannot continue!"
+
+def _not_frozen():
+    if read_flag("auto/frozen"):
+        return "No forecast issued because St. Lawrence is already frozen"
+
+def _not_test():
+    if os.environ.get("TEST") == "True":
+        return "No plots when testing"
+
+def _twater_host():
+    # the daily water temperature data is only available on 'requiredhost'
+    requiredhost = os.environ.get("SLICEOP_TWATER_HOST", "")
+    if requiredhost not in " ".join(platform.uname()):
+        return ("Host is not " + requiredhost + ", cannot access daily water"
+                " temperature!")
+
+def _updatey():
+    if not read_flag("downloads/updatey"):
+        return ("No preprocessing performed because SEAS5.1 and/or ERA5 could"
+                " not be updated.")
+
+# raw data read by the preprocessing
+GRIB_FILES = ["downloads/ERA5/*.grib", "downloads/SEAS51/*.grib"]
+
+# update and plot the daily time series of water temperature, download the
+# latest MODIS image and update the echart data
+def daily():
+    return [
+        Stage("twater", "downloads/daily_Twater.py", when=_twater_host,
+              volatile=True),
+        Stage("plot", "auto/daily_plots.py", after=["twater"],
+              inputs=["downloads/Twater/Twater_Longueuil_updated.nc",
+                      "prepro/*.nc", "auto/*FUD*", "auto/frozen*"],
+              outputs=["auto/Twater_*.png"], key=run_date),
+        Stage("modis", "downloads/daily_MODIS.py", volatile=True),
+        Stage("echart", "auto/daily_prepare_data_for_echart.py",
+              volatile=True),
+    ]
+
+# stages of the weekly or monthly forecast ('kind'), from the download of the
+# data with the script 'download' to the plots
+def _forecast(kind, download, input_file):
+    return [
+        Stage("download", download, when=_yearly_done, volatile=True),
+        Stage("preprocess", "prepro/" + kind + "_preprocess.py",
+              after=["download"], inputs=GRIB_FILES,
+              outputs=["prepro/" + input_file], key=run_date,
+              provides={"input_forecast": "monthly_vars"}),
+        Stage("forecast", "auto/" + kind + "_forecast.py",
+              after=["preprocess"], inputs=["prepro/monthly_predictors.nc"],
+              outputs=["auto/*FUD" + kind], key=run_date, when=_not_frozen),
+        Stage("plot", "auto/" + kind + "_plots.py", after=["forecast"],
+              inputs=["auto/*FUDweekly", "auto/*FUDmonthly"],
+              when=_not_test),
+    ]
+
+# update ERA5, preprocess and run the weekly forecast
+def weekly():
+    return _forecast("weekly", "downloads/weekly_ERA5.py",
+                     "input_forecast_weekly.nc")
+
+# download SEAS5.1 and/or ERA5, preprocess and run the monthly forecast
+def monthly():
+    return _forecast("monthly", "downloads/monthly_SEAS51_ERA5.py",
+                     "input_forecast.nc")
+
+# run the yearly preprocessing if the necessary downloads were successful
+def yearly():
+    return [
+        Stage("preprocess", "prepro/yearly_preprocess.py", when=_updatey,
+              inputs=["downloads/ERA5/*.grib",
+                      "downloads/Twater/Twater_Longueuil_updated.nc"],
+              outputs=["prepro/monthly_predictors.nc",
+                       "prepro/FUD_preprocessed.nc",
+                       "prepro/Twater_Longueuil_preprocessed.nc"],
+              key=run_date),
+    ]
+
+SCHEDULES = {"daily": daily, "weekly": weekly, "monthly": monthly,
+             "yearly": yearly}
+
+# run the schedule 'name' and report how long it took, with 'materialize'
+# False the preprocessed input of the forecast is only kept in memory
+def run(name, materialize=True):
+    print("---------- " + name + " -----------")
+    start = time.perf_counter()
+    status = Pipeline(os.environ["SLICEOP_PATH"], SCHEDULES[name](),
+                      materialize=materialize, name=name).run()
+    # the weekly and monthly forecasts can only run after a successful yearly
+    # preprocessing, an unchanged preprocessing keeps its earlier result
+    if name == "yearly" and status["preprocess"] not in ("done", "unchanged"):
+        write_flag("prepro/preproy", False)
+    print("\n[" + name + " finished after "
+          + f"{time.perf_counter() - start:.2f}" + " s: "
+          + ", ".join(k + " " + v for k, v in status.items()) + "]")
+    print("-----------------------------------")
+    return status
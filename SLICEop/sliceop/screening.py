@@ -0,0 +1,181 @@
+''' screening
+
+Screening of candidate predictors of the freeze-up dayofyear. The forecast
+uses the predictors in `predictors.json` (by default Dec. 2m temperature,
+Nov. snowfall and Sept. total cloud cover averaged over one box). To re-tune
+them, this builds a cube of candidate predictors (years x variables x months
+x regions) from the ERA5 data in `downloads/ERA5`: the monthly mean or sum of
+the mean over each region (a box within the downloaded area), read from the
+box means cached by `gribcache.py`. The regression of `FUDoy` (from
+`prepro/monthly_predictors.nc`) on every combination of up to `max_size`
+candidates is then cross-validated with the batched closed-form updates of
+`skill.py`, by a pool of processes working on chunks of combinations.
+
+    python -m sliceop screen [--variables VAR ...] [--months MM ...]
+                             [--regions NAME=SOUTH,NORTH,WEST,EAST ...]
+                             [--max-size N] [--folds K] [--workers N]
+                             [--top N] [--output FILE] [--download]
+
+'''
+import os
+import time
+import functools
+import itertools
+import concurrent.futures
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from sliceop import cds, gribcache, inputs, registry, skill
+from sliceop.gribcache import open_box_mean
+
+# variables whose monthly predictor is the sum over the month, the others are
+# averaged unless `predictors.json` defines the method
+SUMS = ["snowfall", "total_precipitation", "snowmelt", "runoff"]
+
+# number of combinations cross-validated at once
+CHUNK = 4096
+
+# monthly predictor of 'variable' in 'month' over 'region' (None for the
+# whole area) from the ERA5 file 'filename', with 'method' (sum or mean, by
+# default see `SUMS`)
+def reduce(filename, variable, month, region, method=None):
+    box = open_box_mean(filename, region=region)
+    short_var = list(box.data_vars)[0]
+    if method is None:
+        method = "sum" if variable in SUMS else "mean"
+    return float(inputs.era5_monthly(inputs.era5_hourly(box, short_var),
+                                     short_var, month, method))
+
+# ERA5 file of 'variable' in 'month' of 'year'
+def _era5_file(path, year, month, variable):
+    return (path + "/downloads/ERA5/ERA5_" + str(year) + month + "_"
+            + variable + ".grib")
+
+# download the ERA5 files of the cube that are not in 'path' yet, over the
+# area of `predictors.json` (the regions need to be within it). returns the
+# files that could not be downloaded
+def download(path, years, variables, months):
+    predictors = registry.load(path)
+    downloader = cds.Downloader(path + "/downloads/cds_requests.json",
+                                short_names=predictors.grib_names)
+    for year in years:
+        for variable in variables:
+            for month in months:
+                downloader.add(_era5_file(path, year, month, variable),
+                               *cds.era5_request(variable, month, year,
+                                                 predictors.lats,
+                                                 predictors.lons))
+    failed = downloader.run()
+    gribcache.ingest(downloader.completed)
+    return failed
+
+# cube of the candidate predictors (years x variables x months x regions),
+# 'regions' maps names to (south, north, west, east) or None for the whole
+# area. candidates whose ERA5 file is missing are NaN
+def build_cube(path, years, variables, months, regions):
+    methods = {p.variable: p.method for p in registry.load(path)}
+    values = np.full((len(years), len(variables), len(months), len(regions)),
+                     np.nan)
+    for i, year in enumerate(years):
+        for j, variable in enumerate(variables):
+            for k, month in enumerate(months):
+                filename = _era5_file(path, year, month, variable)
+                if not os.path.isfile(filename):
+                    continue
+                for l, region in enumerate(regions.values()):
+                    values[i, j, k, l] = reduce(filename, variable, month,
+                                                region, methods.get(variable))
+    return xr.DataArray(values, dims=("time", "variable", "month", "region"),
+                        coords={"time": list(years), "variable": variables,
+                                "month": months, "region": list(regions)},
+                        name="candidates")
+
+# names and values (years x candidates) of the candidates of 'cube' that are
+# available in all years
+def candidates(cube):
+    stacked = cube.stack(candidate=("variable", "month", "region")).transpose(
+        "time", "candidate")
+    keep = ~np.isnan(stacked.values).any(axis=0)
+    names = [variable + " " + month + " " + region for variable, month, region
+             in stacked.candidate.values[keep]]
+    return names, stacked.values[:, keep]
+
+# MAE and RMSE of the leave-one-out and 'k'-fold forecasts of 'y' by the
+# regression on each combination of the columns of 'data' in 'combos'
+# (combinations x size)
+def _evaluate(combos, data, y, k):
+    X = np.moveaxis(data[:, combos], 1, 0)
+    return np.column_stack(skill.scores(skill.loo_forecasts(X, y), y)
+                           + skill.scores(skill.kfold_forecasts(X, y, k), y))
+
+# cross-validate the regression of 'y' on every combination of up to
+# 'max_size' of the candidates of 'cube' with 'k' folds, chunks of
+# combinations are evaluated by 'workers' processes. returns the table of the
+# skill of each combination, sorted by the leave-one-out RMSE
+def screen(cube, y, max_size=3, k=5, workers=1):
+    names, data = candidates(cube)
+    y = np.asarray(y, dtype=float)
+    evaluate = functools.partial(_evaluate, data=data, y=y, k=k)
+    rows = []
+    pool = None
+    if workers > 1:
+        pool = concurrent.futures.ProcessPoolExecutor(workers)
+    try:
+        for size in range(1, min(max_size, len(names)) + 1):
+            combos = np.array(list(itertools.combinations(range(len(names)),
+                                                          size)))
+            chunks = [combos[i:i + CHUNK]
+                      for i in range(0, len(combos), CHUNK)]
+            if pool is None:
+                results = map(evaluate, chunks)
+            else:
+                results = pool.map(evaluate, chunks)
+            scores = np.concatenate(list(results))
+            for combo, s in zip(combos, scores):
+                rows.append([", ".join(names[c] for c in combo), size]
+                            + s.tolist())
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    table = pd.DataFrame(rows, columns=["predictors", "size", "loo_mae",
+                                        "loo_rmse", "kfold_mae",
+                                        "kfold_rmse"])
+    return table.sort_values("loo_rmse", ignore_index=True)
+
+# screen the candidates of 'variables', 'months' and 'regions' for the years
+# of `prepro/monthly_predictors.nc` in 'path' and write the table to 'output'
+# (by default `prepro/screening.csv`). by default the variables are those of
+# `predictors.json` and the months those from the first to the last month of
+# its predictors. with 'fetch' the missing ERA5 files are downloaded first
+def run(path, variables=None, months=None, regions=None, max_size=3, k=5,
+        workers=1, output=None, fetch=False):
+    predictors = registry.load(path)
+    if variables is None:
+        variables = list(dict.fromkeys(predictors.variables))
+    if months is None:
+        first, last = (min(predictors.months, key=registry.season_index),
+                       max(predictors.months, key=registry.season_index))
+        months = registry.MONTHS[registry.season_index(first):
+                                 registry.season_index(last) + 1]
+    if regions is None:
+        regions = {"box": None}
+    if output is None:
+        output = path + "/prepro/screening.csv"
+    start = time.perf_counter()
+    with xr.open_dataset(path + "/prepro/monthly_predictors.nc") as ds:
+        years = [int(y) for y in ds.time.values]
+        y = ds.FUDoy.values
+    if fetch:
+        download(path, years, variables, months)
+    cube = build_cube(path, years, variables, months, regions)
+    print("Candidate cube of " + str(len(years)) + " years, "
+          + str(int(np.isnan(cube.values).any(axis=0).sum()))
+          + " of " + str(cube.values[0].size) + " candidates incomplete, "
+          + "built after " + f"{time.perf_counter() - start:.1f}" + " s")
+    table = screen(cube, y, max_size=max_size, k=k, workers=workers)
+    table.to_csv(output + ".tmp", index=False)
+    os.replace(output + ".tmp", output)
+    print(str(len(table)) + " combinations cross-validated after "
+          + f"{time.perf_counter() - start:.1f}" + " s, written to " + output)
+    return table
@@ -0,0 +1,108 @@
+''' seasonmatrix
+
+Dense (seasons x 365) float32 matrix of the water temperature on the
+Jul. 1 - Jun. 30 axis, one row per season. Past seasons are taken from
+`T_no_offset` in `Twater_Longueuil_preprocessed.nc`, the days after the end of
+the preprocessed record come from `Twater_Longueuil_updated.nc` with the mean
+winter offset removed (and negatives set to 0). The matrix is kept as a `.npz`
+artifact next to the preprocessed file: it is rebuilt when the preprocessed
+file changes and otherwise only updated with the days that `daily_Twater.py`
+appends. The daily scripts index its rows instead of selecting each season by
+date.
+
+'''
+import os
+import numpy as np
+
+from sliceop import seasons
+
+# default location of the matrix belonging to the preprocessed file
+def matrix_file_for(prepro_file):
+    return os.path.splitext(prepro_file)[0] + "_season_matrix.npz"
+
+# remove the mean winter offset from recent data, negatives are set to 0
+def _remove_offset(values, offset):
+    values = np.asarray(values, dtype=float) - offset
+    values[values < 0] = 0
+    return values
+
+# write the matrix and everything needed to update it to 'artifact'
+def _save(artifact, season_years, matrix, offset, last_date, stat):
+    with open(artifact + ".tmp", "wb") as f:
+        np.savez(f, seasons=season_years, matrix=matrix, offset=offset,
+                 last_date=np.datetime64(last_date, "ns"),
+                 size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    os.replace(artifact + ".tmp", artifact)
+
+# load 'artifact' if it was built from the current 'prepro_file'
+def _read(artifact, stat):
+    if not os.path.isfile(artifact):
+        return None
+    with np.load(artifact) as npz:
+        if (int(npz["size"]) != stat.st_size
+                or int(npz["mtime_ns"]) != stat.st_mtime_ns):
+            return None
+        return {k: npz[k] for k in npz.files}
+
+# build the matrix from the preprocessed and the updated record
+def build_season_matrix(prepro_file, updated_file, artifact=None):
+    if artifact is None:
+        artifact = matrix_file_for(prepro_file)
+    # import xarray only when the matrix needs to be rebuilt
+    import xarray as xr
+    stat = os.stat(prepro_file)
+    with xr.open_dataset(prepro_file) as ds:
+        dates = ds.Date.values
+        values = ds.T_no_offset.values
+        offset = float(ds.T_winter_offset.mean())
+    with xr.open_dataset(updated_file) as ds:
+        recent = ds.Date.values > dates[-1]
+        dates = np.concatenate([dates, ds.Date.values[recent]])
+        values = np.concatenate([values,
+                                 _remove_offset(ds.T.values[recent], offset)])
+    season_years, matrix = seasons.season_matrix(dates, values,
+                                                 dtype=np.float32)
+    _save(artifact, season_years, matrix, offset, dates[-1], stat)
+    return season_years, matrix
+
+# return the seasons and the matrix, rebuilding it only if the preprocessed
+# file changed since it was built
+def load_season_matrix(prepro_file, updated_file, artifact=None):
+    if artifact is None:
+        artifact = matrix_file_for(prepro_file)
+    stored = _read(artifact, os.stat(prepro_file))
+    if stored is None:
+        return build_season_matrix(prepro_file, updated_file, artifact)
+    return stored["seasons"], stored["matrix"]
+
+# write the days in 'dates' that were appended to the updated record into the
+# matrix, adding rows for new seasons
+def update_season_matrix(prepro_file, updated_file, dates, values,
+                         artifact=None):
+    if artifact is None:
+        artifact = matrix_file_for(prepro_file)
+    stat = os.stat(prepro_file)
+    stored = _read(artifact, stat)
+    if stored is None:
+        # the rebuild already includes the appended days
+        return build_season_matrix(prepro_file, updated_file, artifact)
+    dates = np.asarray(dates, dtype="datetime64[ns]")
+    new = dates > stored["last_date"]
+    if not new.any():
+        return stored["seasons"], stored["matrix"]
+    dates = dates[new]
+    values = _remove_offset(np.asarray(values)[new], stored["offset"])
+    season_years, matrix = stored["seasons"], stored["matrix"]
+    rows = seasons.season_year(dates) - season_years[0]
+    days = seasons.season_day(dates)
+    # add a row of NaN for each season that started since the last update
+    if rows.max() >= len(season_years):
+        extra = rows.max() - len(season_years) + 1
+        matrix = np.vstack([matrix, np.full((extra, seasons.SEASON_DAYS),
+                                            np.nan, dtype=matrix.dtype)])
+        season_years = np.arange(season_years[0],
+                                 season_years[0] + len(matrix))
+    use = days < seasons.SEASON_DAYS
+    matrix[rows[use], days[use]] = values[use]
+    _save(artifact, season_years, matrix, stored["offset"], dates.max(), stat)
+    return season_years, matrix
@@ -0,0 +1,75 @@
+''' seasons
+
+Map dates to the seasons that SLICEop uses to carve up the water temperature
+record: forecast seasons that run from July 1 to June 30 and winters made of
+December, January and February. The labels are computed once for all dates,
+per-season values can then be broadcast back to the dates with a single
+`np.take`.
+
+'''
+import numpy as np
+
+# number of days of a season on the Jul. 1 - Jun. 30 axis, for seasons that
+# end in a leap year Jun. 30 is dropped
+SEASON_DAYS = 365
+
+# calendar year and month (1-12) of each date
+def year_month(dates):
+    dates = np.asarray(dates, dtype="datetime64[ns]")
+    years = dates.astype("datetime64[Y]").astype(int) + 1970
+    months = dates.astype("datetime64[M]").astype(int) % 12 + 1
+    return years, months
+
+# forecast season of each date, i.e. the year of the July in which the season
+# starts
+def season_year(dates):
+    years, months = year_month(dates)
+    return years - (months < 7)
+
+# day of the season of each date, counted from Jul. 1 (0) onward
+def season_day(dates):
+    dates = np.asarray(dates, dtype="datetime64[ns]").astype("datetime64[D]")
+    start = (season_year(dates) - 1970).astype("datetime64[Y]").astype(
+        "datetime64[M]") + np.timedelta64(6, "M")
+    return (dates - start.astype("datetime64[D]")).astype(int)
+
+# winter of each date, December is counted towards the winter of the next year
+def winter_year(dates):
+    years, months = year_month(dates)
+    return years + (months == 12)
+
+# mean of 'values' over December, January and February of each winter,
+# returns the winters, their means and the index of each date's winter
+def winter_means(dates, values):
+    values = np.asarray(values, dtype=float)
+    _, months = year_month(dates)
+    winters, inverse = np.unique(winter_year(dates), return_inverse=True)
+    use = ((months == 12) | (months <= 2)) & ~np.isnan(values)
+    sums = np.bincount(inverse[use], weights=values[use],
+                       minlength=len(winters))
+    counts = np.bincount(inverse[use], minlength=len(winters))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(counts > 0, sums / counts, np.nan)
+    return winters, means, inverse
+
+# broadcast the mean of each winter to December - April of that winter, all
+# other dates (and the December after the last year in 'dates') are NaN
+def winter_offset(dates, values):
+    years, months = year_month(dates)
+    winters, means, inverse = winter_means(dates, values)
+    offset = np.take(means, inverse)
+    apply = (((months <= 4) | (months == 12))
+             & (winter_year(dates) <= years.max()))
+    return np.where(apply, offset, np.nan)
+
+# arrange 'values' in a (seasons x 365) matrix aligned to the Jul. 1 - Jun. 30
+# axis, returns the seasons (rows) and the matrix, days without data are NaN
+def season_matrix(dates, values, dtype=float):
+    seasons = season_year(dates)
+    days = season_day(dates)
+    first = seasons.min()
+    matrix = np.full((seasons.max() - first + 1, SEASON_DAYS), np.nan,
+                     dtype=dtype)
+    use = days < SEASON_DAYS
+    matrix[seasons[use] - first, days[use]] = np.asarray(values)[use]
+    return np.arange(first, seasons.max() + 1), matrix
@@ -0,0 +1,96 @@
+''' skill
+
+Cross-validated skill of the linear regression of the freeze-up dayofyear
+(`FUDoy`) on the monthly predictors in `monthly_predictors.nc`. Instead of
+refitting the regression once per held-out year (or fold), the held-out
+forecasts follow from a single fit with the hat matrix H = X (X'X)^-1 X' of
+the design matrix X (the predictors and a column of ones for the intercept)
+and the residuals e of the fit on all years:
+
+- leave-one-out: the forecast of year i fitted without year i is
+  y_i - e_i / (1 - H_ii)
+- k-fold: the residuals of the years S of a fold fitted without S are
+  (I - H_SS)^-1 e_S
+
+H is computed from the QR decomposition of X. All functions work on stacks
+of design matrices (..., years, predictors), so that all combinations of
+predictors (or of many candidate predictors, see `screening.py`) are
+cross-validated with a few batched matrix operations.
+
+    python -m sliceop skill [--folds K] [--output FILE]
+
+'''
+import itertools
+import numpy as np
+import pandas as pd
+
+# design matrices of the predictors 'X' (..., years, predictors) with a column
+# of ones for the intercept
+def design(X):
+    X = np.asarray(X, dtype=float)
+    return np.concatenate([X, np.ones(X.shape[:-1] + (1,))], axis=-1)
+
+# orthonormal basis Q of the columns of the design matrices of 'X', H = QQ',
+# and the residuals of the least squares fit of 'y' (years) on them
+def fit(X, y):
+    Q, _ = np.linalg.qr(design(X))
+    y = np.asarray(y, dtype=float)
+    fitted = Q @ (np.swapaxes(Q, -1, -2) @ y[..., None])
+    return Q, y - fitted[..., 0]
+
+# forecast of each year of 'y' by the regression on 'X' fitted without that
+# year
+def loo_forecasts(X, y):
+    Q, e = fit(X, y)
+    h = np.sum(Q ** 2, axis=-1)
+    return y - e / (1 - h)
+
+# years in each of the 'k' folds of 'n' years, blocks of consecutive years
+def folds(n, k):
+    return np.array_split(np.arange(n), k)
+
+# forecast of each year of 'y' by the regression on 'X' fitted without the
+# years of its fold, for 'k' folds
+def kfold_forecasts(X, y, k):
+    Q, e = fit(X, y)
+    y = np.asarray(y, dtype=float)
+    forecasts = np.empty_like(e)
+    for years in folds(e.shape[-1], k):
+        Qs = Q[..., years, :]
+        A = np.eye(len(years)) - Qs @ np.swapaxes(Qs, -1, -2)
+        es = np.linalg.solve(A, e[..., years, None])[..., 0]
+        forecasts[..., years] = y[..., years] - es
+    return forecasts
+
+# mean absolute error and root mean square error of 'forecasts' of 'y' over
+# the years (last axis)
+def scores(forecasts, y):
+    error = forecasts - y
+    return (np.mean(np.abs(error), axis=-1),
+            np.sqrt(np.mean(error ** 2, axis=-1)))
+
+# skill of the regression of FUDoy on each combination of 'variables' in
+# 'predictors' (the dataset in `monthly_predictors.nc`), including the
+# climatology (no predictors). returns a table of the MAE and RMSE of the fit
+# and of the leave-one-out and 'k'-fold forecasts, sorted by the
+# leave-one-out RMSE
+def evaluate(predictors, variables, k=5):
+    y = predictors.FUDoy.values.astype(float)
+    data = np.column_stack([predictors[v].values for v in variables])
+    rows = []
+    for size in range(0, len(variables) + 1):
+        combos = list(itertools.combinations(range(len(variables)), size))
+        # (combinations, years, predictors)
+        X = np.moveaxis(data[:, combos], 1, 0).reshape(len(combos), len(y),
+                                                       size)
+        _, e = fit(X, y)
+        skill = (scores(y - e, y) + scores(loo_forecasts(X, y), y)
+                 + scores(kfold_forecasts(X, y, k), y))
+        for i, combo in enumerate(combos):
+            rows.append([", ".join(variables[c] for c in combo)
+                         or "(climatology)", size]
+                        + [float(s[i]) for s in skill])
+    table = pd.DataFrame(rows, columns=["predictors", "size", "fit_mae",
+                                        "fit_rmse", "loo_mae", "loo_rmse",
+                                        "kfold_mae", "kfold_rmse"])
+    return table.sort_values("loo_rmse", ignore_index=True)
@@ -0,0 +1,54 @@
+''' splice
+
+Replacement of the leading days of a SEAS5.1 forecast by the ERA5 data that
+is already available (see `weekly_preprocess.py`). The forecast is an array
+of (members x lead times) of daily values, or of values accumulated since
+the forecast was issued for variables like snowfall. The ERA5 data is a
+vector of daily means or sums starting on the first of the month.
+
+'''
+import numpy as np
+
+# lead time index of the first ERA5 day, given the valid times of the daily
+# SEAS5.1 lead times 'seas_time' and of the ERA5 days 'era5_time'. the first
+# ERA5 day can be before the first lead time (the first lead time of a
+# forecast issued on the 1st is the 2nd), which gives a negative offset
+def splice_offset(seas_time, era5_time):
+    if len(era5_time) == 0:
+        return 0
+    first = int(np.searchsorted(seas_time, era5_time[0]))
+    if first < len(seas_time) and seas_time[first] == era5_time[0]:
+        return first
+    return -int(np.searchsorted(era5_time, seas_time[0]))
+
+# replace the lead times of 'seas' (members x lead times) covered by the
+# daily ERA5 values 'era5', whose first day is at lead time 'offset' (see
+# `splice_offset`). with 'method' "sum", 'seas' holds the accumulation since
+# the issue date: the replaced lead times get the accumulated ERA5 values
+# (continuing from the forecast's accumulation before the first ERA5 day)
+# and the later lead times are shifted by the difference at the last ERA5
+# day. returns the spliced array
+def splice(seas, era5, offset, method):
+    seas = np.asarray(seas)
+    era5 = np.asarray(era5)
+    out = seas.copy()
+    leads = np.arange(era5.size) + offset
+    valid = (leads >= 0) & (leads < seas.shape[1])
+    leads = leads[valid]
+    if leads.size == 0:
+        return out
+    if method == "sum":
+        if offset > 0:
+            base = seas[:, offset - 1]
+        else:
+            base = np.zeros(seas.shape[0], dtype=seas.dtype)
+        new = base[:, None] + np.cumsum(era5)[valid][None, :]
+        out[:, leads] = new
+        last = leads[-1]
+        out[:, last + 1:] = (seas[:, last + 1:] - seas[:, last, None]
+                             + out[:, last, None])
+    elif method == "mean":
+        out[:, leads] = era5[valid][None, :]
+    else:
+        raise ValueError("No method (sum or mean) specified")
+    return out
@@ -0,0 +1,82 @@
+''' store
+
+Append-only storage of daily time series like `Twater_Longueuil_updated.nc`.
+The files are netCDF4 files with an unlimited `Date` dimension, so new days
+are written in place after the last stored day instead of rewriting the whole
+record. Backups are updated the same way by shipping only the days that the
+backup does not have yet.
+
+'''
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import netCDF4
+
+# make sure the `Date` dimension of 'filename' is unlimited, files that were
+# written without it (e.g. before the append-only store was introduced) are
+# converted once
+def ensure_unlimited(filename, dim="Date"):
+    with netCDF4.Dataset(filename) as nc:
+        unlimited = nc.dimensions[dim].isunlimited()
+    if not unlimited:
+        # xarray is only needed for this one-time conversion
+        import xarray as xr
+        with xr.open_dataset(filename) as ds:
+            ds = ds.load()
+        ds.to_netcdf(filename + ".tmp", unlimited_dims=[dim])
+        os.replace(filename + ".tmp", filename)
+
+# return the last 'n' dates and values of 'var' stored in 'filename'
+def read_tail(filename, var="T", n=1, dim="Date"):
+    with netCDF4.Dataset(filename) as nc:
+        time = nc.variables[dim]
+        calendar = getattr(time, "calendar", "standard")
+        dates = netCDF4.num2date(time[-n:], time.units, calendar,
+                                 only_use_cftime_datetimes=False,
+                                 only_use_python_datetimes=True)
+        values = np.ma.filled(nc.variables[var][-n:].astype(float), np.nan)
+    return pd.DatetimeIndex(dates).values, values
+
+# append the days in 'dates' that come after the last stored day to 'filename'
+# and return the number of days that were appended
+def append_days(filename, dates, values, var="T", dim="Date"):
+    with netCDF4.Dataset(filename, "a") as nc:
+        time = nc.variables[dim]
+        calendar = getattr(time, "calendar", "standard")
+        n = len(time)
+        new = netCDF4.date2num(pd.DatetimeIndex(dates).to_pydatetime(),
+                               time.units, calendar)
+        # the store is append-only, days that are already present are kept
+        keep = new > time[n - 1] if n > 0 else np.ones(len(new), dtype=bool)
+        new = new[keep]
+        order = np.argsort(new)
+        new, idx = np.unique(new[order], return_index=True)
+        k = len(new)
+        if k > 0:
+            time[n:n + k] = new
+            nc.variables[var][n:n + k] = np.asarray(values)[keep][order][idx]
+    return k
+
+# update the copy of 'filename' in 'backup_dir' with the days that were
+# appended since the last backup, a full copy is only made if there is no
+# usable backup yet
+def backup(filename, backup_dir, dim="Date"):
+    target = os.path.join(backup_dir, os.path.basename(filename))
+    if os.path.isfile(target):
+        with netCDF4.Dataset(filename) as src, \
+             netCDF4.Dataset(target, "a") as dst:
+            n_src = len(src.dimensions[dim])
+            n_dst = len(dst.dimensions[dim])
+            # only append if the backup is a true prefix of the source
+            if (dst.dimensions[dim].isunlimited() and 0 < n_dst <= n_src
+                    and dst.variables[dim][n_dst - 1]
+                    == src.variables[dim][n_dst - 1]):
+                for name, var in src.variables.items():
+                    if dim in var.dimensions and n_src > n_dst:
+                        dst.variables[name][n_dst:n_src] = \
+                            var[n_dst:n_src]
+                return n_src - n_dst
+    shutil.copy2(filename, target)
+    with netCDF4.Dataset(target) as nc:
+        return len(nc.dimensions[dim])
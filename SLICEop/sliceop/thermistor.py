@@ -0,0 +1,201 @@
+''' thermistor
+
+Streaming ingest of the 1-minute water temperature data that the thermistor at
+the Longueuil water treatment plant sends to the server every hour. Each
+`Longueuil.dat<i>.dat` file is parsed into NumPy arrays and folded into daily
+averages one day at a time, so memory use stays the same no matter how many
+files have piled up since the last successful update.
+
+'''
+import csv
+import numpy as np
+import pandas as pd
+
+# number of 1-minute samples in a day, used to size the buffers
+SAMPLES_PER_DAY = 1440
+
+# function to read data from thermistor (works for files newer than
+# Longueuil.dat4860.dat, before that the format was different)
+# returns the time stamps and temperatures as NumPy arrays, 'Bad' values in
+# the temperature column are converted to NaN while parsing
+def read_thermistor_new(inputfile):
+    tmp = pd.read_csv(inputfile, sep=",", header=None, usecols=[0, 2],
+                      quoting=csv.QUOTE_ALL, na_values=["Bad"])
+    times = pd.to_datetime(tmp[0]).to_numpy().astype("datetime64[ns]")
+    values = pd.to_numeric(tmp[2], errors="coerce").to_numpy(dtype=float)
+    return times, values
+
+# forward fill NaN in 'values', leading NaN are filled with 'first' if given
+def _ffill(values, first=None):
+    idx = np.where(np.isnan(values), 0, np.arange(len(values)))
+    idx = np.maximum.accumulate(idx)
+    filled = values[idx]
+    if first is not None:
+        filled[np.isnan(filled)] = first
+    return filled
+
+# convert datetime64[ns] to hours, the unit used for the dT / dt criterion
+def _hours(times):
+    return times.astype("int64") / 3.6e12
+
+
+class DailyAccumulator:
+    ''' Fold 1-minute temperature samples into quality controlled daily means.
+
+    Samples are written into a preallocated buffer that holds a single day.
+    As soon as a sample from a later day arrives, the buffered day is quality
+    controlled and reduced to its daily average, and the buffer is reused for
+    the next day. The quality control is the same as the one that used to be
+    applied to the whole update at once: samples are outliers if the
+    temperature changes more than 1 degree per hour, is larger than 30 degrees
+    or is more than 3 degrees warmer than the average of its day. Outliers are
+    replaced by linearly interpolated values before computing the daily mean.
+    The last sample of the previous day and the first sample of the next day
+    are carried over so that dT / dt and the interpolation see the same
+    neighbours as on a continuous time series.
+
+    '''
+
+    def __init__(self, capacity=2 * SAMPLES_PER_DAY):
+        self._times = np.empty(capacity, dtype="datetime64[ns]")
+        self._values = np.empty(capacity, dtype=float)
+        self._n = 0
+        # day currently held in the buffer
+        self._day = None
+        # last (forward filled) sample of the previous day
+        self._prev = None
+        # last valid sample of the previous day after quality control
+        self._prev_valid = None
+        # day whose average waits for the first valid value of the next day
+        self._pending = None
+        self._dates = []
+        self._means = []
+
+    # add a chunk of samples, e.g. the content of one thermistor file
+    def add(self, times, values):
+        if len(times) == 0:
+            return
+        order = np.argsort(times, kind="stable")
+        times = np.asarray(times, dtype="datetime64[ns]")[order]
+        values = np.asarray(values, dtype=float)[order]
+        days = times.astype("datetime64[D]")
+        # samples from days that were already completed cannot be added anymore
+        if self._day is not None:
+            keep = days >= self._day
+            times, values, days = times[keep], values[keep], days[keep]
+            if len(times) == 0:
+                return
+        # split the chunk at the day boundaries
+        breaks = np.flatnonzero(days[1:] != days[:-1]) + 1
+        starts = np.concatenate([[0], breaks])
+        stops = np.concatenate([breaks, [len(times)]])
+        for i0, i1 in zip(starts, stops):
+            if self._day is not None and days[i0] != self._day:
+                self._finish(times[i0], values[i0])
+            self._day = days[i0]
+            self._append(times[i0:i1], values[i0:i1])
+
+    # complete the day that is currently in the buffer, to be called after the
+    # last file has been added
+    def flush(self):
+        if self._n > 0:
+            self._finish(None, np.nan)
+        self._close_pending()
+
+    # return the dates and the daily average temperatures of all completed days
+    def result(self):
+        dates = np.array(self._dates, dtype="datetime64[D]").astype(
+            "datetime64[ns]")
+        return dates, np.array(self._means, dtype=float)
+
+    def _append(self, times, values):
+        n = self._n + len(times)
+        # grow the buffer in the unlikely case that one day has more samples
+        # than expected (e.g. duplicated files)
+        if n > len(self._times):
+            size = max(n, 2 * len(self._times))
+            self._times = np.concatenate(
+                [self._times[:self._n],
+                 np.empty(size - self._n, dtype="datetime64[ns]")])
+            self._values = np.concatenate(
+                [self._values[:self._n], np.empty(size - self._n)])
+        self._times[self._n:n] = times
+        self._values[self._n:n] = values
+        self._n = n
+
+    def _finish(self, next_time, next_value):
+        # sort the buffered day and drop duplicate time stamps
+        t, idx = np.unique(self._times[:self._n], return_index=True)
+        T = self._values[:self._n][idx]
+        n = len(t)
+        Tf = _ffill(T, None if self._prev is None else self._prev[1])
+        # compute dT / dt in degrees per hour with the neighbouring samples
+        # of the previous and the next day
+        th = _hours(t)
+        Te, te = Tf, th
+        lo = 0
+        if self._prev is not None:
+            Te = np.concatenate([[self._prev[1]], Te])
+            te = np.concatenate([[_hours(self._prev[0])], te])
+            lo = 1
+        if next_time is not None:
+            if np.isnan(next_value):
+                next_value = Tf[-1]
+            Te = np.concatenate([Te, [next_value]])
+            te = np.concatenate([te, [_hours(next_time)]])
+        if len(te) > 1:
+            dTdt = np.gradient(Te, te)[lo:lo + n]
+        else:
+            dTdt = np.zeros(n)
+        # remove outliers: fast changes and temperatures above 30 degrees
+        with np.errstate(invalid="ignore"):
+            ok = (np.abs(dTdt) < 1.0) & (T < 30.)
+        Ts = np.where(ok, T, np.nan)
+        # remove values more than 3 degrees above the average of the day
+        valid = ~np.isnan(Ts)
+        if valid.any():
+            Ts[valid & (Ts - Ts[valid].mean() >= 3.)] = np.nan
+            valid = ~np.isnan(Ts)
+        # replace outliers by linear interpolation between valid values
+        xp, fp = th[valid], Ts[valid]
+        if self._prev_valid is not None:
+            xp = np.concatenate([[_hours(self._prev_valid[0])], xp])
+            fp = np.concatenate([[self._prev_valid[1]], fp])
+        trailing = np.zeros(n, dtype=bool)
+        if len(xp) > 0:
+            gaps = ~valid & (th > xp[0]) & (th < xp[-1])
+            Ts[gaps] = np.interp(th[gaps], xp, fp)
+            trailing = ~valid & (th > xp[-1])
+        # now that the first valid value of this day is known, the gap at the
+        # end of the previous day can be filled and its average computed
+        if valid.any():
+            self._fill_pending(th[valid][0], Ts[valid][0])
+        self._close_pending()
+        # the gap at the end of this day has to wait for the next day
+        filled = ~np.isnan(Ts)
+        self._pending = [self._day, Ts[filled].sum(), int(filled.sum()),
+                         th[trailing],
+                         (xp[-1], fp[-1]) if len(xp) > 0 else None]
+        # keep what is needed from this day to process the next one
+        self._prev = (t[-1], Tf[-1])
+        if valid.any():
+            last = np.flatnonzero(valid)[-1]
+            self._prev_valid = (t[last], Ts[last])
+        self._n = 0
+
+    def _fill_pending(self, x1, v1):
+        if self._pending is None or self._pending[4] is None:
+            return
+        x0, v0 = self._pending[4]
+        gaps = self._pending[3]
+        self._pending[1] += np.interp(gaps, [x0, x1], [v0, v1]).sum()
+        self._pending[2] += len(gaps)
+
+    # reduce the pending day to its daily average
+    def _close_pending(self):
+        if self._pending is None:
+            return
+        day, total, count = self._pending[0:3]
+        self._dates.append(day)
+        self._means.append(total / count if count > 0 else np.nan)
+        self._pending = None
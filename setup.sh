@@ -4,4 +4,5 @@ export SLICEOP_CONDA_PATH=/aos/home/jrieck/miniconda3/etc/profile.d/conda.sh
 export SLICEOP_BACKUP_PATH=/aos/home/jrieck/SLICEop_backup_data/
 export SLICEOP_TWATER_HOST=crunch
 export SLICEOP_THERMISTOR_PATH=/storage/thermistor/
+export SLICEOP_DASK_CHUNKS=0
 export TEST=False